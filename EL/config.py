@@ -3,5 +3,17 @@ config_settings = {
 	"datapath": {
 		"server_datapath": "/path/smorakis/commonness_score_computation/data_folder",
 		"local_datapath": "/path/commonness_score_computation/data_folder",
-	}["server_datapath"]
+	}["server_datapath"],
+	"stopwords_path": None,		# optional json file of precomputed stopwords, see EL.utils.helper_funcs.store_stopwords()
+	"pem_source_weights": {		# PemController weight of each p(e|m) source's counts (1 if not present)
+		# "WikiPemIndexer": 1,
+		# "YagoPemIndexer": 0.5,
+	},
+	"pem_pruning": {		# PemController.prune() policies, applied once the p(e|m) index is built (empty for no pruning)
+		# "min_mention_count": 2,
+		# "min_entity_count": 2,
+		# "top_k": 100,
+		# "min_prob": 0.001,
+		# "cumulative_mass": 0.99,
+	},
 }
@@ -0,0 +1,160 @@
+from array import array
+
+class EntityIdTable():
+	'''
+		Dense entity ID index, array-backed and indexed by document ID (entityid):
+			slots:				entityid -> position in {self._tokens} ( -1 if absent )
+			redirects:			entityid -> entityid of final redirect target ( -1 if not redirecting )
+			disambiguation:		bitmap, bit {entityid} is set for disambiguation pages
+		Lookups and exclusion checks are O(1) w/o any per-entry Python objects.
+		Dict-like interface, used in place of {entityid: WikipediaEntity} dicts:
+			table[entityid], table.get(entityid), entityid in table, table.items(), ...
+		If the max. entity ID is known in advance, reserve() sizes the arrays exactly (once),
+		otherwise they grow geometrically on assignment and trim() shrinks them to the max. assigned entity ID afterwards.
+	'''
+
+	def __init__(
+		self,
+		disambiguation_bitmap: bytes = b'',
+	):
+		self._tokens: list = []										# entity objects, in insertion order
+		self._slots = array('i')									# entityid as index, position in {self._tokens} as value
+		self._redirects = array('i')								# entityid as index, final target entityid as value
+		self._disambiguation = bytearray(disambiguation_bitmap)		# bit per entityid
+		self._max_entityid = -1										# max. entityid assigned to {self._slots} / {self._redirects}
+
+	def reserve(
+		self,
+		max_entityid: int,
+	) -> None:
+		'''
+			Grow arrays and the disambiguation bitmap to exactly fit entity IDs up to {max_entityid}.
+			New arrays are allocated at their final size and existing values copied over (extend() would over-allocate).
+		'''
+		if max_entityid >= len(self._slots):
+			slots, redirects = self._slots, self._redirects
+			self._slots = array('i', [-1]) * (max_entityid + 1)
+			self._slots[:len(slots)] = slots
+			self._redirects = array('i', [-1]) * (max_entityid + 1)
+			self._redirects[:len(redirects)] = redirects
+		byte_count = (max_entityid >> 3) + 1
+		if byte_count > len(self._disambiguation):
+			disambiguation = self._disambiguation
+			self._disambiguation = bytearray(byte_count)
+			self._disambiguation[:len(disambiguation)] = disambiguation
+
+	def _reserve(
+		self,
+		entityid: int,
+	) -> None:
+		''' Grow arrays (geometrically) so that {entityid} is a valid index. '''
+		if entityid > self._max_entityid:
+			self._max_entityid = entityid
+		if entityid >= len(self._slots):
+			extension = max(entityid + 1, 2 * len(self._slots)) - len(self._slots)
+			self._slots.extend(array('i', [-1]) * extension)
+			self._redirects.extend(array('i', [-1]) * extension)
+
+	def trim(self) -> None:
+		'''
+			Shrink arrays to fit the max. assigned entity ID, and the disambiguation bitmap to its last set bit,
+			i.e. drop the spare capacity left by geometric growth once the table is filled.
+			Arrays are truncated in place (reallocated w/o a copy of their contents).
+		'''
+		del self._slots[self._max_entityid + 1:]
+		del self._redirects[self._max_entityid + 1:]
+		del self._disambiguation[len(self._disambiguation.rstrip(b'\x00')):]
+
+	def get(
+		self,
+		entityid: int,
+		default: object = None,
+	) -> object:
+		if 0 <= entityid < len(self._slots) and self._slots[entityid] >= 0:
+			return self._tokens[self._slots[entityid]]
+		return default
+
+	def __getitem__(
+		self,
+		entityid: int,
+	) -> object:
+		token = self.get(entityid, None)
+		if token is None:
+			raise KeyError(entityid)
+		return token
+
+	def __setitem__(
+		self,
+		entityid: int,
+		token: object,
+	) -> None:
+		'''
+			Assign entity object to {entityid}.
+			The entity's redirect_to_entityid attribute is copied to the redirects array.
+		'''
+		self._reserve(entityid)
+		if self._slots[entityid] >= 0:
+			self._tokens[self._slots[entityid]] = token
+		else:
+			self._slots[entityid] = len(self._tokens)
+			self._tokens.append(token)
+		self.set_redirect(entityid, token.redirect_to_entityid)
+
+	def __contains__(
+		self,
+		entityid: object,
+	) -> bool:
+		return isinstance(entityid, int) and self.get(entityid, None) is not None
+
+	def __len__(self) -> int:
+		return len(self._tokens)
+
+	def __iter__(self) -> iter:
+		for token in self._tokens:
+			yield token.entityid
+
+	def items(self) -> iter:
+		for token in self._tokens:
+			yield token.entityid, token,
+
+	def values(self) -> iter:
+		for token in self._tokens:
+			yield token
+
+	def get_redirect(
+		self,
+		entityid: int,
+	) -> int:
+		''' Return entityid of the final redirect target of {entityid}, otherwise -1. '''
+		if 0 <= entityid < len(self._redirects):
+			return self._redirects[entityid]
+		return -1
+
+	def set_redirect(
+		self,
+		entityid: int,
+		target_entityid: int = None,
+	) -> None:
+		''' Set (or clear, if {target_entityid} is None) the redirect target of {entityid}. '''
+		self._reserve(entityid)
+		self._redirects[entityid] = -1 if target_entityid is None else target_entityid
+
+	def add_disambiguation(
+		self,
+		entityid: int,
+	) -> None:
+		byte_index = entityid >> 3
+		if byte_index >= len(self._disambiguation):
+			self._disambiguation.extend(bytes(max(byte_index + 1, 2 * len(self._disambiguation)) - len(self._disambiguation)))
+		self._disambiguation[byte_index] |= 1 << (entityid & 7)
+
+	def is_disambiguation(
+		self,
+		entityid: int,
+	) -> bool:
+		byte_index = entityid >> 3
+		return byte_index < len(self._disambiguation) and bool(self._disambiguation[byte_index] & (1 << (entityid & 7)))
+
+	@property
+	def disambiguation_bitmap(self) -> bytes:
+		return bytes(self._disambiguation)
@@ -1,6 +1,17 @@
 from EL.tokens.token_handler_service import TokenHandlerService
 from EL.tokens.tokens.wikipedia_token import WikipediaEntity
+from EL.tokens.tokens import wikipedia_token
+from EL.tokens.tokens.formatting import entity_formatting_base, entity_formatting_el, entity_formatting_en
 from EL.entity_indexers.entity_indexer_base import EntityIndexerBase
+from EL.entity_indexers.entity_id_table import EntityIdTable
+from EL.utils import helper_funcs
+from array import array
+import itertools
+import hashlib
+import inspect
+import pickle
+import sys
+import os
 
 class WikiEntityIndexer(EntityIndexerBase):
 	'''
@@ -8,6 +19,8 @@ class WikiEntityIndexer(EntityIndexerBase):
 		Subclass of EntityIndexerBase and must therefore override EntityIndexerBase' abstract build_entity_index() funtion, depending on use-case.
 	'''
 
+	_format_batch_size: int = 10000
+
 	def __init__(
 		self, 
 		datapath: object,
@@ -18,7 +31,7 @@ class WikiEntityIndexer(EntityIndexerBase):
 		self._entity_handler = TokenHandlerService(WikipediaEntity)				# (Overrides super()._entity_handler) Used for constructing WikipediaEntity objects 
 		self._helper_dicts = {													# Opt. lookup
 			'formatted_entitynames': {},										# formatted_entityname as key, WikipediaEntity as value
-			'entity_ids': {},													# entityid as key, WikipediaEntity as value
+			'entity_ids': EntityIdTable(),										# entityid as index, WikipediaEntity (+ redirect target, disambiguation bit) as value
 		}
 
 	def _get_redirected_entity(
@@ -31,10 +44,13 @@ class WikiEntityIndexer(EntityIndexerBase):
 					( an entity that redirects to another entity via its redirect_to_entityid attribute )
 			output:
 				target_entity: WikipediaEntity ( its redirect_to_entityid attribute is None )
+			Note:
+				Redirect chains are flattened by _flatten_redirects(), hence a single jump is required.
 		'''
 		if token:
-			while token.redirect_to_entityid in self._helper_dicts['entity_ids']:
-				token = self._helper_dicts['entity_ids'][token.redirect_to_entityid]
+			target_entityid = self._helper_dicts['entity_ids'].get_redirect(token.entityid)
+			if target_entityid >= 0:
+				return self._helper_dicts['entity_ids'][target_entityid]
 			return token
 
 	def __getitem__(
@@ -103,11 +119,13 @@ class WikiEntityIndexer(EntityIndexerBase):
 			return key in self._entities
 		return False
 
-	def _get_disambig_entityids(self) -> list:
+	def _set_disambig_entityids(self) -> None:
 		'''
+			Desc:
+				Mark disambiguation pages in the disambiguation bitmap of {self._helper_dicts['entity_ids']}.
 			File format: document id | document title
 		'''
-		disambig_pages = []
+		entity_ids = self._helper_dicts['entity_ids']
 		src_file = 'wiki_disambiguation_pages.txt'
 		path = self._datapath / src_file
 		assert path.exists(), f'Invalid path {path}'
@@ -118,15 +136,11 @@ class WikiEntityIndexer(EntityIndexerBase):
 		) as f:
 			for line in f:
 				try:
-					disambig_pages.append(int(line[:line.index('\t')]))
+					entity_ids.add_disambiguation(int(line[:line.index('\t')]))
 				except:
 					raise Exception(f'Invalid format: {src_file}')
-		return disambig_pages
 
-	def _set_redirects(
-		self,
-		excl_pages: list
-	) -> None:
+	def _set_redirects(self) -> None:
 		'''
 			File format: source unquoted URL | target unquoted URL | source document ID
 
@@ -160,7 +174,10 @@ class WikiEntityIndexer(EntityIndexerBase):
 					)
 				except:
 					raise Exception(f'Invalid format: {src_file}')
-				if target_document_title in self._entities and source_document_id not in excl_pages:
+				if (
+					target_document_title in self._entities
+					and not self._helper_dicts['entity_ids'].is_disambiguation(source_document_id)
+				):
 					if source_document_title not in self._entities:
 						# add entity to {self._entities}
 						token = self._entity_handler.build_token(source_document_title, source_document_id)
@@ -170,43 +187,244 @@ class WikiEntityIndexer(EntityIndexerBase):
 					source_token = self._entities[source_document_title]
 					target_token = self._entities[target_document_title]
 					source_token.redirect_to_entityid = target_token.entityid
+		self._flatten_redirects()
+
+	def _flatten_redirects(self) -> None:
+		'''
+			Desc:
+				Collapse every redirect chain (A -> B -> C) to its final target (A -> C, B -> C), once.
+				Broken chains are detected and reported:
+					dangling: last entity of the chain redirects to an unknown entity ID
+						-> that entity becomes the final target (same as following the chain hop by hop)
+					cycle: chain revisits one of its entities (A -> B -> A)
+						-> redirects of the cycle's entities are dropped, so that each of them resolves to itself
+		'''
+		entity_ids = self._helper_dicts['entity_ids']
+		final_entityids = {}				# entityid as key, entityid of final target as value
+		dangling_count, cycles = 0, []
+		for entityid in entity_ids:
+			path, visited = [], set()
+			current_entityid = entityid
+			while True:
+				if current_entityid in final_entityids:
+					final_entityid = final_entityids[current_entityid]
+					break
+				if current_entityid not in entity_ids:
+					# dangling - previous entity of the chain is the final target
+					dangling_count += 1
+					final_entityid = path[-1]
+					break
+				if current_entityid in visited:
+					cycle = path[path.index(current_entityid):]
+					cycles.append(cycle)
+					for cycle_entityid in cycle:
+						final_entityids[cycle_entityid] = cycle_entityid
+					final_entityid = current_entityid
+					break
+				path.append(current_entityid)
+				visited.add(current_entityid)
+				if entity_ids[current_entityid].redirect_to_entityid is None:
+					final_entityid = current_entityid
+					break
+				current_entityid = entity_ids[current_entityid].redirect_to_entityid
+			for path_entityid in path:
+				final_entityids.setdefault(path_entityid, final_entityid)
+		for entityid, token in entity_ids.items():
+			if final_entityids[entityid] == entityid:
+				del token.redirect_to_entityid
+			else:
+				token.redirect_to_entityid = final_entityids[entityid]
+			entity_ids.set_redirect(entityid, token.redirect_to_entityid)
+		if dangling_count or cycles:
+			print(
+				'Invalid redirects found:\n'
+				f'\tDangling redirect chains: "{dangling_count}"\n'
+				f'\tRedirect cycles: "{len(cycles)}"'
+			)
+			for cycle in cycles[:10]:
+				print('\t\t' + ' -> '.join(entity_ids[cycle_entityid].text_fragment for cycle_entityid in cycle + cycle[:1]))
+
+	@property
+	def snapshot_path(self) -> object:
+		return self._datapath / 'entity_index.snapshot'
+
+	def _get_snapshot_key(
+		self,
+		src_files: list,
+		*build_args,
+	) -> str:
+		'''
+			Desc:
+				Return a hex digest of:
+					1. the content of each source file in {src_files}
+					2. the source code of this module and of the entity formatting rules (and the configured language)
+					3. build_entity_index() arguments {build_args}
+				A stored snapshot is only valid if its key matches.
+		'''
+		snapshot_key = hashlib.sha1(repr((self._entity_handler.token_type._lang, build_args)).encode('utf-8'))
+		for src_file in src_files:
+			path = self._datapath / src_file
+			assert path.exists(), f'Invalid path {path}'
+			with open(path, 'rb') as f:
+				for block in iter(lambda: f.read(16 * 1024 ** 2), b''):
+					snapshot_key.update(block)
+		for formatting_module in (
+			sys.modules[self.__class__.__module__],
+			wikipedia_token,
+			entity_formatting_base,
+			entity_formatting_el,
+			entity_formatting_en,
+			helper_funcs,
+		):
+			snapshot_key.update(inspect.getsource(formatting_module).encode('utf-8'))
+		return snapshot_key.hexdigest()
+
+	def _store_snapshot(
+		self,
+		snapshot_key: str,
+	) -> None:
+		'''
+			Desc:
+				Store the entity table (titles, IDs, formatted titles, redirects) and the insertion order of
+				{self._entities} and {self._helper_dicts} as flat arrays in a binary snapshot (written atomically).
+		'''
+		tokens, token_indexes = [], {}
+		for token in itertools.chain(
+			self._entities.values(),
+			self._helper_dicts['formatted_entitynames'].values(),
+			self._helper_dicts['entity_ids'].values(),
+		):
+			if id(token) not in token_indexes:
+				token_indexes[id(token)] = len(tokens)
+				tokens.append(token)
+		snapshot = {
+			'key': snapshot_key,
+			'titles': [token.text_fragment for token in tokens],
+			'formatted_entitynames': [token.formatted_entityname for token in tokens],
+			'entityids': array('q', (token.entityid for token in tokens)),
+			'redirect_to_entityids': array(
+				'q',
+				(
+					-1 if token.redirect_to_entityid is None else token.redirect_to_entityid
+					for token in tokens
+				)
+			),
+			'entities': array('Q', (token_indexes[id(token)] for token in self._entities.values())),
+			'formatted_entitynames_helper': array('Q', (token_indexes[id(token)] for token in self._helper_dicts['formatted_entitynames'].values())),
+			'entity_ids_helper': array('Q', (token_indexes[id(token)] for token in self._helper_dicts['entity_ids'].values())),
+			'disambiguation_bitmap': self._helper_dicts['entity_ids'].disambiguation_bitmap,
+		}
+		tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + '.tmp')
+		with open(tmp_path, 'wb') as f:
+			pickle.dump(snapshot, f, protocol = pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp_path, self.snapshot_path)
+
+	def _load_snapshot(
+		self,
+		snapshot_key: str,
+	) -> bool:
+		'''
+			Desc:
+				Fill {self._entities} and {self._helper_dicts} from the binary snapshot, w/o re-applying any formatting rules.
+				Return False if no snapshot exists or its key does not match {snapshot_key}.
+		'''
+		if not self.snapshot_path.exists():
+			return False
+		with open(self.snapshot_path, 'rb') as f:
+			snapshot = pickle.load(f)
+		if snapshot['key'] != snapshot_key:
+			return False
+		tokens = [
+			self._entity_handler.build_token(
+				title,
+				entityid,
+				None if redirect_to_entityid < 0 else redirect_to_entityid,
+				formatted_entityname,
+			)
+			for title, formatted_entityname, entityid, redirect_to_entityid in zip(
+				snapshot['titles'],
+				snapshot['formatted_entitynames'],
+				snapshot['entityids'],
+				snapshot['redirect_to_entityids'],
+			)
+		]
+		self._entities = {
+			tokens[index].text_fragment: tokens[index]
+			for index in snapshot['entities']
+		}
+		self._helper_dicts['formatted_entitynames'] = {
+			tokens[index].formatted_entityname: tokens[index]
+			for index in snapshot['formatted_entitynames_helper']
+		}
+		self._helper_dicts['entity_ids'] = EntityIdTable(snapshot['disambiguation_bitmap'])
+		self._helper_dicts['entity_ids'].reserve(max(snapshot['entityids'], default = -1))
+		for index in snapshot['entity_ids_helper']:
+			self._helper_dicts['entity_ids'][tokens[index].entityid] = tokens[index]
+		return True
 
 	def build_entity_index(
 		self, 
 		exclude_disambiguation_pages: bool = True, 
-		combine_redirects: bool = True
+		combine_redirects: bool = True,
+		use_snapshot: bool = True,
 	) -> object:
 		'''
 			Desc:
 				fill super()._entities dict w/ entity (doc ids and doc titles) Tokens
+				If {use_snapshot} is True, the finished index is loaded from / stored in a binary snapshot ( {self.snapshot_path} ),
+					keyed by the source files' and formatting rules' hashes.
 			File format:
 				document title | document id
 		'''
 		print(f'Loading KB entities...')
-		excl_pages = self._get_disambig_entityids() if exclude_disambiguation_pages else []
 		src_file = 'wiki_name_id_map.txt'
-		path = self._datapath / src_file
-		assert path.exists(), f'Invalid path {path}'
-		with open(path, 
-			'r', 
-			encoding='utf-8'
-		) as f:
-			for i, line in enumerate(f):
-				data = line.split('\t')
-				try:
-					title, doc_id = (
-						data[0], 
-						int(data[1])
+		if use_snapshot:
+			snapshot_key = self._get_snapshot_key(
+				[src_file]
+				+ (['wiki_disambiguation_pages.txt'] if exclude_disambiguation_pages else [])
+				+ (['wiki_redirects.txt'] if combine_redirects else []),
+				exclude_disambiguation_pages,
+				combine_redirects,
+			)
+		if use_snapshot and self._load_snapshot(snapshot_key):
+			print(f'Loaded KB entities from snapshot "{self.snapshot_path}".')
+		else:
+			if exclude_disambiguation_pages:
+				self._set_disambig_entityids()
+			path = self._datapath / src_file
+			assert path.exists(), f'Invalid path {path}'
+			with open(path, 
+				'r', 
+				encoding='utf-8'
+			) as f:
+				# titles are formatted in batches via WikipediaEntity.format_text_fragments()
+				for lines in iter(lambda: list(itertools.islice(f, self._format_batch_size)), []):
+					rows = []
+					for line in lines:
+						data = line.split('\t')
+						try:
+							title, doc_id = (
+								data[0], 
+								int(data[1])
+							)
+						except:
+							raise Exception(f'Invalid format: {src_file}')
+						if not self._helper_dicts['entity_ids'].is_disambiguation(doc_id):
+							rows.append((title, doc_id))
+					formatted_entitynames = self._entity_handler.token_type.format_text_fragments(
+						[title for title, _ in rows]
 					)
-				except:
-					raise Exception(f'Invalid format: {src_file}')
-				if doc_id not in excl_pages:
-					token = self._entity_handler.build_token(title, doc_id)
-					self._entities[title] = token
-					self._helper_dicts['formatted_entitynames'][token.formatted_entityname] = token
-					self._helper_dicts['entity_ids'][token.entityid] = token
-		if combine_redirects:
-			self._set_redirects(excl_pages)
+					for (title, doc_id), formatted_entityname in zip(rows, formatted_entitynames):
+						token = self._entity_handler.build_token(title, doc_id, formatted_entityname = formatted_entityname)
+						self._entities[title] = token
+						self._helper_dicts['formatted_entitynames'][token.formatted_entityname] = token
+						self._helper_dicts['entity_ids'][token.entityid] = token
+			if combine_redirects:
+				self._set_redirects()
+			# grown while loading, entity IDs are not known in advance
+			self._helper_dicts['entity_ids'].trim()
+			if use_snapshot:
+				self._store_snapshot(snapshot_key)
 		assert len(self._entities), 'No KB entities were loaded.'
 		assert len(self._helper_dicts['entity_ids']) == len(self._entities), 'Entity ID - Entity Name is supposed to be a one-to-one relation.'
 		print(
@@ -0,0 +1,60 @@
+'''
+	Per-entity memory footprint of slot-based WikipediaEntity objects vs. the previous __dict__-based layout.
+	Strings (titles) are allocated before measuring, so only the entity objects themselves are accounted for.
+	Usage:
+		python -m EL.helper_scripts.token_memory_benchmark [entity_count]
+'''
+from EL.tokens.tokens.wikipedia_token import WikipediaEntity
+import tracemalloc
+import time
+import sys
+
+class DictWikipediaEntity():
+	'''
+		Replica of the previous WikipediaEntity instance layout (per-instance __dict__, hash computed on every call).
+	'''
+
+	def __init__(
+		self,
+		document_title: str,
+		document_id: int,
+		redirect_to_document_id: int = None,
+		formatted_entityname: str = None,
+	):
+		self._text_fragment = document_title
+		self._entityid = document_id
+		self._formatted_entityname = formatted_entityname
+		self._redirect_to_entityid = redirect_to_document_id
+
+	def __hash__(self) -> hash:
+		return hash(('wikipedia', self._text_fragment, self._entityid))
+
+def measure(
+	entity_class: type,
+	titles: list,
+) -> tuple:
+	'''
+		Return tuple( bytes per entity, seconds for inserting all entities in a set )
+	'''
+	tracemalloc.start()
+	entities = [
+		entity_class(title, entityid, None, title)
+		for entityid, title in enumerate(titles)
+	]
+	size, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	start_time = time.perf_counter()
+	for _ in range(10):
+		set(entities)
+	return (size - sys.getsizeof(entities)) / len(entities), time.perf_counter() - start_time,
+
+if __name__ == '__main__':
+	entity_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+	titles = [f'Entity title {i}' for i in range(entity_count)]
+	for entity_class in (DictWikipediaEntity, WikipediaEntity):
+		bytes_per_entity, hash_time = measure(entity_class, titles)
+		print(
+			f'{entity_class.__name__}:\n'
+			f'\tbytes per entity: {bytes_per_entity:.1f}\n'
+			f'\thashing ({entity_count} entities x 10 set builds): {hash_time:.3f}s'
+		)
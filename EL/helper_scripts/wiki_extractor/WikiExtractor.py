@@ -59,22 +59,28 @@ import bz2
 import cgi
 import codecs
 import fileinput
+import gc
 import json
 import logging
 import os.path
+import pickle
 import re  # TODO use regex when it will be standard
 import sys
 import time
 from html.entities import name2codepoint
 from io import StringIO
-from itertools import zip_longest
+from itertools import islice, zip_longest
 from math import acos, asin, atan, ceil, cos, e, exp, floor
 from math import log as ln
 from math import pi, sin, tan, trunc
-from multiprocessing import Process, Queue, Value, cpu_count
+from collections import deque
+from contextlib import closing
+from multiprocessing import Condition, Pool, Process, Queue, Value, cpu_count
 from timeit import default_timer
 from types import SimpleNamespace
 from urllib.parse import quote
+from xml.parsers import expat
+from xml.sax.saxutils import escape
 
 text_type = str
 
@@ -142,6 +148,11 @@ options = SimpleNamespace(
     ##
     # Minimum expanded text length required to print document
     min_text_length=0,
+    ##
+    # Whether to scan the dump with an incremental XML parser (pages_from_xml)
+    # instead of regular expressions (pages_from): about 2x slower, but it does
+    # not rely on tags being laid out one per line
+    xml_parser=False,
     # Shared objects holding templates, redirects and cache
     templates={},
     redirects={},
@@ -2755,8 +2766,13 @@ class NextFile(object):
 
     filesPerDir = 100
 
-    def __init__(self, path_name):
+    def __init__(self, path_name, dir_suffix=""):
+        """
+        :param path_name: directory where to create subdirectories of files.
+        :param dir_suffix: suffix of subdirectory names, i.e. AA{dir_suffix}.
+        """
         self.path_name = path_name
+        self.dir_suffix = dir_suffix
         self.dir_index = -1
         self.file_index = -1
 
@@ -2775,7 +2791,8 @@ class NextFile(object):
         char1 = self.dir_index % 26
         char2 = self.dir_index // 26 % 26
         return os.path.join(
-            self.path_name, "%c%c" % (ord("A") + char2, ord("A") + char1)
+            self.path_name,
+            "%c%c%s" % (ord("A") + char2, ord("A") + char1, self.dir_suffix),
         )
 
     def _filepath(self):
@@ -2839,8 +2856,8 @@ def load_templates(file, output_file=None):
 
     if output_file:
         output = codecs.open(output_file, "wb", "utf-8")
-    for page_count, page_data in enumerate(pages_from(file)):
-        id, revid, title, ns, catSet, page = page_data
+    for page_count, page_data in enumerate(read_pages(file)):
+        id, revid, title, ns, catSet, page = page_data[:6]
         if not output_file and (
             not options.templateNamespace or not options.moduleNamespace
         ):  # do not know it yet
@@ -2875,6 +2892,99 @@ def load_templates(file, output_file=None):
         logging.info("Saved %d templates to '%s'", len(options.templates), output_file)
 
 
+def parse_templates():
+    """
+    Parse all template definitions of options.templates into options.templateCache.
+    """
+    for title, text in options.templates.items():
+        options.templateCache[title] = Template.parse(text)
+    options.templates.clear()
+
+
+def template_source_key(input_file, template_file=None):
+    """
+    Identify the source of the parsed templates, for validating a template cache.
+    :param input_file: name of the wikipedia dump file.
+    :param template_file: optional file with template definitions, used as
+        source instead of the dump if present.
+    :return: (source file, size, modification time), None for a stdin dump.
+    """
+    if template_file and os.path.exists(template_file):
+        source = template_file
+    elif input_file != "-":
+        source = input_file
+    else:
+        return None
+    stat = os.stat(source)
+    return os.path.abspath(source), stat.st_size, stat.st_mtime_ns
+
+
+def template_settings():
+    """
+    :return: the settings the parsed templates depend on, i.e. template expansion
+        and the template/module namespaces read from <siteinfo>.
+    """
+    return options.expand_templates, options.templateNamespace, options.moduleNamespace
+
+
+def store_template_cache(cache_file, key):
+    """
+    Save parsed templates (options.templateCache), template redirects and
+    template/module namespaces to :param cache_file:.
+    :param key: (template_source_key(), template_settings()) of the templates.
+    """
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(
+            {
+                "version": version,
+                "key": key,
+                "templateNamespace": options.templateNamespace,
+                "templatePrefix": options.templatePrefix,
+                "moduleNamespace": options.moduleNamespace,
+                "modulePrefix": options.modulePrefix,
+                "templates": options.templateCache,
+                "redirects": options.redirects,
+            },
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_file, cache_file)
+    logging.info(
+        "Saved %d parsed templates to '%s'", len(options.templateCache), cache_file
+    )
+
+
+def load_template_cache(cache_file, key):
+    """
+    Load parsed templates saved by store_template_cache() from :param cache_file:.
+    :param key: (template_source_key(), template_settings()) of the templates.
+    :return: whether the cache was loaded (it is ignored if saved by another
+        version, or from another source or template settings).
+    """
+    with open(cache_file, "rb") as f:
+        cache = pickle.load(f)
+    if cache.get("version") != version:
+        logging.warning(
+            "Ignoring template cache '%s' of version %s", cache_file, cache.get("version")
+        )
+        return False
+    if key[0] is None or cache.get("key") != key:
+        logging.warning(
+            "Ignoring template cache '%s' of another template source: %s",
+            cache_file,
+            cache.get("key"),
+        )
+        return False
+    options.templateNamespace = cache["templateNamespace"]
+    options.templatePrefix = cache["templatePrefix"]
+    options.moduleNamespace = cache["moduleNamespace"]
+    options.modulePrefix = cache["modulePrefix"]
+    options.templateCache.update(cache["templates"])
+    options.redirects.update(cache["redirects"])
+    return True
+
+
 def pages_from(input):
     """
     Scans input extracting pages.
@@ -2958,8 +3068,260 @@ def pages_from(input):
             page = []
 
 
+# Entities escaped in the XML dump, see pages_from_xml()
+xml_entities = {'"': "&quot;"}
+# Page fields collected by pages_from_xml()
+xml_page_fields = frozenset(["id", "title", "ns", "text"])
+# Lines fed at once to the XML parser
+xml_feed_lines = 1000
+
+
+def pages_from_xml(input):
+    """
+    Scans input extracting pages, like pages_from(), with an incremental
+    (expat) XML parser: only the character data of page fields is collected,
+    no element tree is built.
+    Input may start past <siteinfo>, as left by process_dump().
+    Titles and text are escaped again, so that pages are yielded as pages_from()
+    yields them, i.e. as found in the dump (redirect_title is "" for pages
+    that are not redirects).
+    :return: (id, revid, title, namespace key, catSet, page, redirect, redirect_title),
+        page is a list of lines.
+    """
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.buffer_size = 1 << 20
+    pages = []  # pages completed by the last fed lines
+    fields = {}  # fields of the current page
+    data = []  # character data of the current field
+
+    def start_element(tag, attrs):
+        if tag in xml_page_fields:
+            del data[:]
+            parser.CharacterDataHandler = data.append
+        elif tag == "page":
+            fields.clear()
+        elif tag == "redirect":
+            fields["redirect"] = attrs.get("title", "")
+
+    def end_element(tag):
+        if parser.CharacterDataHandler is not None:
+            parser.CharacterDataHandler = None
+            if tag == "id" and "id" in fields:
+                # as pages_from(), the last <id> of the page
+                tag = "revid"
+            fields[tag] = "".join(data)
+        elif tag == "page":
+            text = escape(fields.get("text", ""), xml_entities)
+            # as pages_from(), only lines not sharing a line with <text> tags
+            # are scanned for categories
+            catSet = set()
+            last_newline = text.rfind("\n")
+            pos = text.find("[[Category:", text.find("\n") + 1, max(last_newline, 0))
+            while pos >= 0:
+                line_end = text.find("\n", pos) + 1
+                line = text[text.rfind("\n", 0, pos) + 1 : line_end]
+                if line.lstrip().startswith("[[Category:"):
+                    mCat = catRE.search(line)
+                    if mCat:
+                        catSet.add(mCat.group(1))
+                pos = text.find("[[Category:", line_end, last_newline)
+            title = fields.get("title")
+            redirect = "redirect" in fields
+            pages.append(
+                (
+                    fields.get("id"),
+                    fields.get("revid"),
+                    escape(title, xml_entities) if title is not None else None,
+                    fields.get("ns", "0"),
+                    catSet,
+                    StringIO(text).readlines(),
+                    redirect,
+                    escape(fields["redirect"], xml_entities) if redirect else "",
+                )
+            )
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    last_id = None
+    started = False
+    while True:
+        lines = list(islice(input, xml_feed_lines))
+        if not lines:
+            break
+        if isinstance(lines[0], text_type):
+            lines = "".join(lines)
+            root_tags = ("<?xml", "<mediawiki")
+        else:
+            lines = b"".join(lines)
+            root_tags = (b"<?xml", b"<mediawiki")
+        if not started:
+            started = True
+            if not lines.lstrip().startswith(root_tags):
+                parser.Parse("<mediawiki>")  # input past <siteinfo>
+        parser.Parse(lines)
+        for page_data in pages:
+            if page_data[0] != last_id:
+                yield page_data
+                last_id = page_data[0]
+        del pages[:]
+
+
+def read_pages(input):
+    """
+    Scans input extracting pages, with the parser selected by options.xml_parser.
+    """
+    if options.xml_parser:
+        return pages_from_xml(input)
+    return pages_from(input)
+
+
+# ----------------------------------------------------------------------
+# Multistream dumps
+
+# Streams decompressed by a single job of MultistreamReader
+multistream_streams_per_job = 10
+
+
+def multistream_offsets(index_file):
+    """
+    Read the stream offsets of a multistream dump from its companion index
+    file (*-multistream-index.txt.bz2, lines of "offset:page_id:title").
+    :return: sorted list of distinct stream offsets.
+    """
+    offsets = set()
+    index = fileinput.FileInput(index_file, openhook=fileinput.hook_compressed)
+    for line in index:
+        if not isinstance(line, text_type):
+            line = line.decode("utf-8")
+        offset = line.split(":", 1)[0]
+        if offset.strip():
+            offsets.add(int(offset))
+    index.close()
+    return sorted(offsets)
+
+
+def decompress_streams(input_file, start, end):
+    """
+    Decompress the bz2 streams stored in bytes [start, end) of :param input_file:.
+    :return: the decoded text.
+    """
+    with open(input_file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return bz2.decompress(data).decode("utf-8")
+
+
+class MultistreamReader(object):
+    """
+    Iterator over the lines of a bz2 multistream dump, whose independent
+    streams are located through the dump's multistream index, decompressed
+    and decoded by a pool of processes, and yielded in dump order.
+    The <siteinfo> stream is decompressed by the reader itself, the pool is
+    only started once lines past it are read (i.e. after process_dump() has
+    started its extract processes).
+    At most 2 * process_count jobs are decompressed ahead of the reader.
+    Usage:
+        with MultistreamReader(input_file, index_file, process_count) as input:
+            for line in input:
+                ...
+    """
+
+    def __init__(self, input_file, index_file, process_count):
+        """
+        :param input_file: name of the *-multistream.xml.bz2 dump file.
+        :param index_file: name of its *-multistream-index.txt[.bz2] file.
+        :param process_count: number of decompression processes to spawn.
+        """
+        offsets = [offset for offset in multistream_offsets(index_file) if offset]
+        end = os.path.getsize(input_file)
+        self.input_file = input_file
+        self.header = (0, offsets[0] if offsets else end)  # <siteinfo> stream
+        offsets = offsets[::multistream_streams_per_job] + [end]
+        self.jobs = zip(offsets, offsets[1:])
+        self.process_count = max(1, process_count)
+        self.pool = None
+        self.lines = self.read_lines()
+
+    def read_lines(self):
+        """
+        Generator of the dump lines, submitting decompression jobs ahead.
+        """
+        text = decompress_streams(self.input_file, *self.header)
+        cut = text.rfind("\n") + 1
+        tail = text[cut:]  # last incomplete line of a job
+        yield from StringIO(text[:cut])
+        self.pool = Pool(self.process_count)
+        pending = deque()  # results of submitted jobs, in dump order
+        while True:
+            while len(pending) < 2 * self.process_count:
+                job = next(self.jobs, None)
+                if job is None:
+                    break
+                pending.append(
+                    self.pool.apply_async(decompress_streams, (self.input_file,) + job)
+                )
+            if not pending:
+                break
+            text = tail + pending.popleft().get()
+            cut = text.rfind("\n") + 1
+            tail = text[cut:]
+            yield from StringIO(text[:cut])
+        if tail:
+            yield tail
+
+    def __iter__(self):
+        return self.lines
+
+    def __next__(self):
+        return next(self.lines)
+
+    next = __next__
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.lines.close()
+        if self.pool:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def open_dump(input_file, multistream_index=None, process_count=1):
+    """
+    :param input_file: name of the wikipedia dump file; '-' to read from stdin
+    :param multistream_index: optional multistream index of :param input_file:,
+        for decompressing its streams in parallel.
+    :param process_count: number of decompression processes (multistream only).
+        Close the returned iterator once done, as it may hold processes.
+    :return: an iterator over the lines of :param input_file:.
+    """
+    if input_file == "-":
+        if multistream_index:
+            raise ValueError("a multistream index cannot be used with stdin dump")
+        return sys.stdin
+    if multistream_index:
+        return MultistreamReader(input_file, multistream_index, process_count)
+    return fileinput.FileInput(input_file, openhook=fileinput.hook_compressed)
+
+
 def process_dump(
-    input_file, template_file, out_file, file_size, file_compress, process_count
+    input_file,
+    template_file,
+    out_file,
+    file_size,
+    file_compress,
+    process_count,
+    multistream_index=None,
+    decompress_count=None,
+    unordered=False,
+    spool_size=256 * 1024 ** 2,
+    template_cache=None,
 ):
     """
     :param input_file: name of the wikipedia dump file; '-' to read from stdin
@@ -2968,12 +3330,21 @@ def process_dump(
     :param file_size: max size of each extracted file, or None for no max (one file)
     :param file_compress: whether to compress files with bzip.
     :param process_count: number of extraction processes to spawn.
+    :param multistream_index: optional multistream index file of :param input_file:,
+        whose streams are then decompressed in parallel.
+    :param decompress_count: number of processes decompressing the
+        multistream dump, by default one per 4 extraction processes.
+    :param unordered: whether each extraction process writes its own files
+        (in its own subdirectories of out_file), in no particular page order.
+    :param spool_size: max bytes of pages dispatched to workers and not yet
+        output, the mapper waits for pages to be output beyond that.
+    :param template_cache: optional file of parsed templates, loaded if present,
+        otherwise created from template_file or from preprocessing the dump.
     """
 
-    if input_file == "-":
-        input = sys.stdin
-    else:
-        input = fileinput.FileInput(input_file, openhook=fileinput.hook_compressed)
+    if not decompress_count:
+        decompress_count = max(1, process_count // 4)
+    input = open_dump(input_file, multistream_index, decompress_count)
 
     # collect siteinfo
     for line in input:
@@ -3008,8 +3379,16 @@ def process_dump(
     if options.expand_templates:
         # preprocess
         template_load_start = default_timer()
-        if template_file:
-            if os.path.exists(template_file):
+        cached = False
+        settings = template_settings()  # before templates may set namespaces
+        if template_cache and os.path.exists(template_cache):
+            logging.info("Loading parsed templates from: %s", template_cache)
+            cached = load_template_cache(
+                template_cache,
+                (template_source_key(input_file, template_file), settings),
+            )
+        if not cached and (template_file or template_cache):
+            if template_file and os.path.exists(template_file):
                 logging.info("Loading template definitions from: %s", template_file)
                 # can't use with here:
                 file = fileinput.FileInput(
@@ -3027,17 +3406,26 @@ def process_dump(
                     "Preprocessing '%s' to collect template definitions: this may take some time.",
                     input_file,
                 )
-                load_templates(input, template_file)
-                input.close()
-                input = fileinput.FileInput(
-                    input_file, openhook=fileinput.hook_compressed
+                with closing(input):
+                    load_templates(input, template_file)
+                input = open_dump(input_file, multistream_index, decompress_count)
+            if template_cache:
+                parse_templates()
+                # template_file, if created by preprocessing the dump, is the source from now on
+                store_template_cache(
+                    template_cache,
+                    (template_source_key(input_file, template_file), settings),
                 )
         template_load_elapsed = default_timer() - template_load_start
         logging.info(
             "Loaded %d templates in %.1fs",
-            len(options.templates),
+            len(options.templates) + len(options.templateCache),
             template_load_elapsed,
         )
+        if template_cache:
+            # parsed templates are shared copy-on-write by the extract processes,
+            # keep the garbage collector from touching (hence copying) them
+            gc.freeze()
 
     # process pages
     logging.info("Starting page extraction from %s.", input_file)
@@ -3046,27 +3434,43 @@ def process_dump(
     # Parallel Map/Reduce:
     # - pages to be processed are dispatched to workers
     # - a reduce process collects the results, sort them and print them.
+    # Unordered:
+    # - pages to be processed are dispatched to workers
+    # - each worker prints its results to its own files.
 
     process_count = max(1, process_count)
     maxsize = 10 * process_count
-    # output queue
-    output_queue = Queue(maxsize=maxsize)
 
     if out_file == "-":
         out_file = None
+        if unordered:
+            logging.warning("writing to stdout, so output is ordered")
+            unordered = False
 
     worker_count = process_count
 
     # load balancing
-    max_spool_length = 10000
-    spool_length = Value("i", 0, lock=False)
+    spool = SpoolLimit(spool_size)
 
-    # reduce job that sorts and prints output
-    reduce = Process(
-        target=reduce_process,
-        args=(options, output_queue, spool_length, out_file, file_size, file_compress),
-    )
-    reduce.start()
+    if unordered:
+        output_queue = None
+        reduce = None
+    else:
+        # output queue
+        output_queue = Queue(maxsize=maxsize)
+        # reduce job that sorts and prints output
+        reduce = Process(
+            target=reduce_process,
+            args=(
+                options,
+                output_queue,
+                spool,
+                out_file,
+                file_size,
+                file_compress,
+            ),
+        )
+        reduce.start()
 
     # initialize jobs queue
     jobs_queue = Queue(maxsize=maxsize)
@@ -3076,7 +3480,17 @@ def process_dump(
     workers = []
     for i in range(worker_count):
         extractor = Process(
-            target=extract_process, args=(options, i, jobs_queue, output_queue)
+            target=extract_process,
+            args=(
+                options,
+                i,
+                jobs_queue,
+                output_queue,
+                spool,
+                out_file,
+                file_size,
+                file_compress,
+            ),
         )
         extractor.daemon = True  # only live while parent process lives
         extractor.start()
@@ -3084,12 +3498,13 @@ def process_dump(
 
     # Mapper process
     page_num = 0
+    delay = 0  # seconds waited for the spool
     # NOTE custom.
     # RUN: python3 WikiExtractor.py ./wiki_corpus.xml --links --filter_disambig_pages --processes 1
-    with open("./wiki_redirects.txt", "w", encoding="utf-8") as rf:
+    with closing(input), open("./wiki_redirects.txt", "w", encoding="utf-8") as rf:
         with open("./wiki_disambiguation_pages.txt", "w", encoding="utf-8") as dis_f:
             with open("./wiki_name_id_map.txt", "w", encoding="utf-8") as id_f:
-                for page_data in pages_from(input):
+                for page_data in read_pages(input):
                     (
                         id,
                         revid,
@@ -3108,19 +3523,12 @@ def process_dump(
 
                     if keepPage(ns, catSet, page, id, title, id_f, dis_f):
                         # slow down
-                        delay = 0
-                        if spool_length.value > max_spool_length:
-                            # reduce to 10%
-                            while spool_length.value > max_spool_length / 10:
-                                time.sleep(10)
-                                delay += 10
-                        if delay:
-                            logging.info("Delay %ds", delay)
-                        job = (id, revid, title, page, page_num)
+                        size = sum(map(len, page))
+                        delay += spool.acquire(size)
+                        job = (id, revid, title, page, page_num, size)
                         jobs_queue.put(job)  # goes to any available extract_process
                         page_num += 1
                     page = None  # free memory
-                input.close()
             id_f.close()
         dis_f.close()
     rf.close()
@@ -3132,11 +3540,14 @@ def process_dump(
     for w in workers:
         w.join()
 
-    # signal end of work to reduce process
-    output_queue.put(None)
-    # wait for it to finish
-    reduce.join()
+    if reduce:
+        # signal end of work to reduce process
+        output_queue.put(None)
+        # wait for it to finish
+        reduce.join()
 
+    if delay:
+        logging.info("Delay %.1fs", delay)
     extract_duration = default_timer() - extract_start
     extract_rate = page_num / extract_duration
     logging.info(
@@ -3156,11 +3567,69 @@ def process_dump(
 # Multiprocess support
 
 
-def extract_process(opts, i, jobs_queue, output_queue):
+class SpoolLimit(object):
+    """
+    Byte limit of the pages dispatched to extract processes and not yet output,
+    shared by the mapper, extract processes and reduce process.
+    The mapper acquires the size of each page before dispatching it, waiting
+    until enough pages have been released, i.e. output.
+    """
+
+    def __init__(self, max_size):
+        """
+        :param max_size: max bytes of pages not yet output.
+        """
+        self.max_size = max_size
+        self.size = Value("q", 0, lock=False)  # guarded by self.condition
+        self.condition = Condition()
+
+    def acquire(self, size):
+        """
+        Wait until :param size: bytes fit the limit (pages larger than the limit
+        are dispatched once all other pages are output) and acquire them.
+        :return: seconds waited.
+        """
+        with self.condition:
+            if self.size.value and self.size.value + size > self.max_size:
+                wait_start = default_timer()
+                self.condition.wait_for(
+                    lambda: not self.size.value
+                    or self.size.value + size <= self.max_size
+                )
+                delay = default_timer() - wait_start
+            else:
+                delay = 0
+            self.size.value += size
+        return delay
+
+    def release(self, size):
+        """
+        Release :param size: bytes of an output page.
+        """
+        with self.condition:
+            self.size.value -= size
+            self.condition.notify()
+
+
+def extract_process(
+    opts,
+    i,
+    jobs_queue,
+    output_queue,
+    spool,
+    out_file=None,
+    file_size=0,
+    file_compress=True,
+):
     """Pull tuples of raw page content, do CPU/regex-heavy fixup, push finished text
     :param i: process id.
     :param jobs_queue: where to get jobs.
-    :param output_queue: where to queue extracted text for output.
+    :param output_queue: where to queue extracted text for output,
+        or None for writing it to files of this process (unordered output).
+    :param spool: SpoolLimit, released once a page is output (unordered output).
+    :param out_file: directory where to write files (unordered output).
+    :param file_size: max file size (unordered output).
+    :param file_compress: whether to compress output (unordered output).
     """
 
     global options
@@ -3169,11 +3638,14 @@ def extract_process(opts, i, jobs_queue, output_queue):
     createLogger(options.quiet, options.debug, options.log_file)
 
     out = StringIO()  # memory buffer
+    if output_queue is None:
+        nextFile = NextFile(out_file, "_%02d" % i)
+        output = OutputSplitter(nextFile, file_size, file_compress)
 
     while True:
-        job = jobs_queue.get()  # job is (id, title, page, page_num)
+        job = jobs_queue.get()  # job is (id, revid, title, page, page_num, size)
         if job:
-            id, revid, title, page, page_num = job
+            id, revid, title, page, page_num, size = job
             try:
                 e = Extractor(*job[:4])  # (id, revid, title, page)
                 page = None  # free memory
@@ -3183,25 +3655,31 @@ def extract_process(opts, i, jobs_queue, output_queue):
                 text = ""
                 logging.exception("Processing page: %s %s", id, title)
 
-            output_queue.put((page_num, text))
+            if output_queue is None:
+                output.write(text.encode("utf-8"))
+                spool.release(size)
+            else:
+                output_queue.put((page_num, text, size))
             out.truncate(0)
             out.seek(0)
         else:
             logging.debug("Quit extractor")
             break
     out.close()
+    if output_queue is None:
+        output.close()
 
 
 report_period = 10000  # progress report period
 
 
 def reduce_process(
-    opts, output_queue, spool_length, out_file=None, file_size=0, file_compress=True
+    opts, output_queue, spool, out_file=None, file_size=0, file_compress=True
 ):
     """Pull finished article text, write series of files (or stdout)
     :param opts: global parameters.
     :param output_queue: text to be output.
-    :param spool_length: spool length.
+    :param spool: SpoolLimit, released once a page is output.
     :param out_file: filename where to print.
     :param file_size: max file size.
     :param file_compress: whether to compress output.
@@ -3224,14 +3702,15 @@ def reduce_process(
 
     interval_start = default_timer()
     # FIXME: use a heap
-    spool = {}  # collected pages
+    pages = {}  # collected pages
     next_page = 0  # sequence numbering of page
     while True:
-        if next_page in spool:
-            output.write(spool.pop(next_page).encode("utf-8"))
+        if next_page in pages:
+            text, size = pages.pop(next_page)
+            output.write(text.encode("utf-8"))
             next_page += 1
             # tell mapper our load:
-            spool_length.value = len(spool)
+            spool.release(size)
             # progress report
             if next_page % report_period == 0:
                 interval_rate = report_period / (default_timer() - interval_start)
@@ -3244,16 +3723,14 @@ def reduce_process(
             pair = output_queue.get()
             if not pair:
                 break
-            page_num, text = pair
-            spool[page_num] = text
-            # tell mapper our load:
-            spool_length.value = len(spool)
+            page_num, text, size = pair
+            pages[page_num] = text, size
             # FIXME: if an extractor dies, process stalls; the other processes
-            # continue to produce pairs, filling up memory.
-            if len(spool) > 200:
+            # continue to produce pairs, up to the spool limit.
+            if len(pages) > 200:
                 logging.debug(
                     "Collected %d, waiting: %d, %d",
-                    len(spool),
+                    len(pages),
                     next_page,
                     next_page == page_num,
                 )
@@ -3275,6 +3752,17 @@ def main():
         description=__doc__,
     )
     parser.add_argument("input", help="XML wiki dump file")
+    parser.add_argument(
+        "--multistream_index",
+        help="multistream index of the input dump (*-multistream-index.txt.bz2), "
+        "for decompressing its streams in parallel",
+    )
+    parser.add_argument(
+        "--decompress_processes",
+        type=int,
+        help="number of processes decompressing a multistream dump "
+        "(default: one per 4 --processes)",
+    )
     groupO = parser.add_argument_group("Output")
     groupO.add_argument(
         "-o",
@@ -3292,6 +3780,12 @@ def main():
     groupO.add_argument(
         "-c", "--compress", action="store_true", help="compress output files using bzip"
     )
+    groupO.add_argument(
+        "--unordered",
+        action="store_true",
+        help="each extract process writes its own files (in AA_<process>... directories), "
+        "pages are not output in dump order",
+    )
     groupO.add_argument(
         "--json",
         action="store_true",
@@ -3315,6 +3809,17 @@ def main():
         help="accepted namespaces in links",
     )
     groupP.add_argument("--templates", help="use or create file containing templates")
+    groupP.add_argument(
+        "--template_cache",
+        help="use or create file containing parsed templates, loaded once and shared by all processes",
+    )
+    groupP.add_argument(
+        "--xml_parser",
+        action="store_true",
+        default=options.xml_parser,
+        help="scan the dump with an incremental XML parser instead of regular expressions, "
+        "slower but independent of the dump's line layout (default=%(default)s)",
+    )
     groupP.add_argument(
         "--no_templates", action="store_false", help="Do not expand templates"
     )
@@ -3364,6 +3869,13 @@ def main():
         default=default_process_count,
         help="Number of processes to use (default %(default)s)",
     )
+    parser.add_argument(
+        "--spool_size",
+        default="256M",
+        help="maximum bytes of pages being extracted and not yet written, "
+        "reading the dump pauses beyond that (default %(default)s)",
+        metavar="n[KMG]",
+    )
 
     groupS = parser.add_argument_group("Special")
     groupS.add_argument(
@@ -3398,6 +3910,7 @@ def main():
     options.write_json = args.json
     options.print_revision = args.revision
     options.min_text_length = args.min_text_length
+    options.xml_parser = args.xml_parser
     if args.html:
         options.keepLinks = True
 
@@ -3414,6 +3927,18 @@ def main():
         logging.error("Insufficient or invalid size: %s", args.bytes)
         return
 
+    try:
+        suffix = args.spool_size[-1:].lower()
+        if suffix and suffix in "kmg":
+            spool_size = int(args.spool_size[:-1]) * 1024 ** ("kmg".index(suffix) + 1)
+        else:  # plain number of bytes
+            spool_size = int(args.spool_size)
+        if spool_size <= 0:
+            raise ValueError()
+    except ValueError:
+        logging.error("Invalid spool size: %s", args.spool_size)
+        return
+
     if args.namespaces:
         options.acceptedNamespaces = set(args.namespaces.split(","))
 
@@ -3479,8 +4004,8 @@ def main():
                     load_templates(file)
 
         file = fileinput.FileInput(input_file, openhook=fileinput.hook_compressed)
-        for page_data in pages_from(file):
-            id, revid, title, ns, catSet, page = page_data
+        for page_data in read_pages(file):
+            id, revid, title, ns, catSet, page = page_data[:6]
             Extractor(id, revid, title, page).extract(sys.stdout)
         file.close()
         return
@@ -3525,6 +4050,11 @@ def main():
         file_size,
         args.compress,
         args.processes,
+        args.multistream_index,
+        args.decompress_processes,
+        args.unordered,
+        spool_size,
+        args.template_cache,
     )
 
 
@@ -0,0 +1,303 @@
+from EL.utils.vocabulary import Vocabulary
+from array import array
+import itertools
+
+class MentionCountStore():
+	'''
+		Compact mention -> entity count store, used by PemIndexerBase for aggregating mention-entity pairs.
+		Mentions are interned in a (shared) mention Vocabulary, i.e. referred to by their mention IDs:
+		every MentionCountStore (of every PemIndexer and of PemController) uses Vocabulary.get_instance('mentions') by default,
+		so that each mention string is held once per process, regardless of the number of stores it is counted in.
+		Each mention ID present in the store is mapped to a row, owning two parallel arrays:
+		KB entity IDs (WikipediaEntity.entityid) and their counts.
+		Mentions can be passed either as str or as mention ID (int) of {self.vocabulary}.
+		Note:
+			Mentions with many distinct entities get an additional entityid -> array position dict,
+			so that increments remain O(1) for very common anchors.
+			Rows of deleted mentions are left empty, until they outnumber the rows in use and are compacted away.
+		Counting modes:
+			exact (default, {capacity} is None): every entity ever seen for a mention is kept.
+			top-k ({capacity} > 0): weighted Space-Saving heavy-hitter counting, at most {capacity} entities per mention.
+				Once a mention is full, an unseen entity replaces the entity w/ the minimum count and inherits that count as its error.
+				For every kept entity: count - error <= true count <= count,
+				and any dropped entity's true count is at most the mention's minimum count.
+				Results depend on the order of add() calls.
+	'''
+
+	_slot_index_threshold: int = 32		# Build {self._slots} lookup for mentions w/ more distinct entities than this
+
+	def __init__(
+		self,
+		capacity: int = None,
+		vocabulary: Vocabulary = None,
+	):
+		assert capacity is None or capacity > 0, 'Invalid capacity'
+		self._capacity = capacity			# max. entities per mention (top-k mode), None for exact counting
+		self._vocabulary = Vocabulary.get_instance('mentions') if vocabulary is None else vocabulary
+		self._rows: dict = {}				# mention ID as key (in insertion order), row as value
+		self._errors: list = []				# row as index, array of count overestimations as value (top-k mode only)
+		self._entity_ids: list = []			# row as index, array of KB entity IDs as value (None if deleted)
+		self._counts: list = []				# row as index, array of counts as value (parallel to {self._entity_ids})
+		self._slots: list = []				# row as index, None or dict( entityid -> array position ) as value
+
+	def _find_row(
+		self,
+		mention: object,
+	) -> int:
+		''' Return row of {mention} (str or mention ID) if present in this store, otherwise None. '''
+		return self._rows.get(mention if isinstance(mention, int) else self._vocabulary.get_id(mention))
+
+	def _add_row(
+		self,
+		mention_id: int,
+	) -> int:
+		''' Add empty arrays of {mention_id} to this store, return its row. '''
+		row = self._rows[mention_id] = len(self._entity_ids)
+		self._entity_ids.append(array('I'))
+		self._counts.append(array('I'))
+		self._slots.append(None)
+		if self._capacity:
+			self._errors.append(array('I'))
+		return row
+
+	def get_mention_id(
+		self,
+		mention: object,
+		create: bool = False,
+	) -> int:
+		'''
+			Return mention ID of {mention} (str or mention ID) if present in this store, otherwise None.
+			If {create} is True, unknown mentions are interned in {self._vocabulary} and added to this store.
+		'''
+		mention_id = mention if isinstance(mention, int) else self._vocabulary.get_id(mention, create = create)
+		if mention_id not in self._rows:
+			if not create:
+				return None
+			self._add_row(mention_id)
+		return mention_id
+
+	@property
+	def capacity(self) -> int:
+		return self._capacity
+
+	@property
+	def vocabulary(self) -> Vocabulary:
+		return self._vocabulary
+
+	def _find_slot(
+		self,
+		row: int,
+		entityid: int,
+	) -> int:
+		''' Return array position of {entityid} in {row}, otherwise -1. '''
+		slots = self._slots[row]
+		if slots is not None:
+			return slots.get(entityid, -1)
+		try:
+			return self._entity_ids[row].index(entityid)
+		except ValueError:
+			return -1
+
+	def add(
+		self,
+		mention: object,
+		entityid: int,
+		count: int = 1,
+		error: int = 0,
+	) -> None:
+		'''
+			Desc:
+				Increase count of the {mention} - {entityid} pair by {count}.
+				{error} is an already known overestimation of {count} (top-k mode only, i.e. when merging top-k stores).
+		'''
+		mention_id = mention if isinstance(mention, int) else self._vocabulary.get_id(mention, create = True)
+		row = self._rows.get(mention_id)
+		if row is None:
+			row = self._add_row(mention_id)
+		slot = self._find_slot(row, entityid)
+		if slot >= 0:
+			self._counts[row][slot] += count
+			if self._capacity:
+				self._errors[row][slot] += error
+			return
+		entity_ids = self._entity_ids[row]
+		if self._capacity:
+			if len(entity_ids) >= self._capacity:
+				self._replace_min(row, entityid, count, error)
+				return
+			self._errors[row].append(error)
+		entity_ids.append(entityid)
+		self._counts[row].append(count)
+		if self._slots[row] is not None:
+			self._slots[row][entityid] = len(entity_ids) - 1
+		elif len(entity_ids) > self._slot_index_threshold:
+			self._slots[row] = {
+				entityid: slot
+				for slot, entityid in enumerate(entity_ids)
+			}
+
+	def _replace_min(
+		self,
+		row: int,
+		entityid: int,
+		count: int,
+		error: int,
+	) -> None:
+		'''
+			Space-Saving step: the entity w/ the minimum count is replaced by {entityid},
+			whose count (and error) is set to that minimum plus {count} ({error}).
+		'''
+		entity_ids, counts = self._entity_ids[row], self._counts[row]
+		min_count = min(counts)
+		slot = counts.index(min_count)
+		if self._slots[row] is not None:
+			del self._slots[row][entity_ids[slot]]
+			self._slots[row][entityid] = slot
+		entity_ids[slot] = entityid
+		counts[slot] = min_count + count
+		self._errors[row][slot] = min_count + error
+
+	def merge(
+		self,
+		other: object,
+	) -> object:
+		'''
+			Desc:
+				Add every count of {other} MentionCountStore object to self.
+				In top-k mode, {other}'s counts (and errors) are added as weighted Space-Saving updates;
+				entities already dropped by {other} are lost, hence their counts (up to {other}'s minimum per mention) are not bounded.
+		'''
+		same_vocabulary = other.vocabulary is self._vocabulary
+		for mention_id in other.mention_ids():
+			mention = mention_id if same_vocabulary else other.vocabulary[mention_id]
+			entity_ids, counts = other.entities(mention_id)
+			errors = other.errors(mention_id) or itertools.repeat(0)
+			for entityid, count, error in zip(entity_ids, counts, errors):
+				self.add(mention, entityid, count, error)
+		return self
+
+	def entities(
+		self,
+		mention: object,
+	) -> tuple:
+		'''
+			Return tuple( entity_ids: array, counts: array ) of {mention}, otherwise None.
+		'''
+		row = self._find_row(mention)
+		if row is not None:
+			return self._entity_ids[row], self._counts[row],
+
+	def errors(
+		self,
+		mention: object,
+	) -> array:
+		'''
+			Return count overestimations of {mention} (parallel to entities(mention) arrays), otherwise None.
+			Always None in exact mode.
+		'''
+		row = self._find_row(mention)
+		if self._capacity and row is not None:
+			return self._errors[row]
+
+	def max_error(self) -> int:
+		''' Return the maximum count overestimation over all mention - entity pairs (0 in exact mode). '''
+		return max((max(errors) for errors in self._errors if errors), default = 0)
+
+	def occurences(
+		self,
+		mention: object,
+	) -> int:
+		''' Return total count of {mention}. '''
+		row = self._find_row(mention)
+		return sum(self._counts[row]) if row is not None else 0
+
+	def mention_ids(self) -> iter:
+		''' yield mention IDs (of {self._vocabulary}) present in this store, in insertion order '''
+		for mention_id in self._rows:
+			yield mention_id
+
+	def items(self) -> iter:
+		'''
+			Similar to dict.items() generator
+			yield tuple(mention: str, entity_ids: array, counts: array)
+		'''
+		for mention_id, row in self._rows.items():
+			yield self._vocabulary[mention_id], self._entity_ids[row], self._counts[row],
+
+	def __delitem__(
+		self,
+		mention: object,
+	) -> None:
+		'''
+			The mention's arrays are released, its mention ID remains interned in {self._vocabulary}.
+			Its row is left empty, rows are compacted once most of them are empty.
+		'''
+		row = self._rows.pop(mention if isinstance(mention, int) else self._vocabulary.get_id(mention), None)
+		if row is None:
+			raise KeyError(mention)
+		self._entity_ids[row] = None
+		self._counts[row] = None
+		self._slots[row] = None
+		if self._capacity:
+			self._errors[row] = None
+		if len(self._entity_ids) > 2 * len(self._rows):
+			self._compact()
+
+	def _compact(self) -> None:
+		''' Drop empty rows (of deleted mentions), mentions keep their insertion order. '''
+		rows = list(self._rows.values())
+		self._rows = dict(zip(self._rows, range(len(rows))))
+		self._entity_ids = [self._entity_ids[row] for row in rows]
+		self._counts = [self._counts[row] for row in rows]
+		self._slots = [self._slots[row] for row in rows]
+		if self._capacity:
+			self._errors = [self._errors[row] for row in rows]
+
+	def __len__(self) -> int:
+		return len(self._rows)
+
+	def __iter__(self) -> iter:
+		for mention_id in self._rows:
+			yield self._vocabulary[mention_id]
+
+	def __contains__(
+		self,
+		mention: object,
+	) -> bool:
+		return self._find_row(mention) is not None
+
+	def __getstate__(self) -> dict:
+		'''
+			Mention IDs are process-local, hence mentions are stored as strings (in insertion order)
+			and interned again on unpickling, in the shared vocabulary of the same name (a private one if unnamed).
+			{self._slots} is a pure lookup and is rebuilt on unpickling.
+		'''
+		return {
+			'capacity': self._capacity,
+			'vocabulary_name': self._vocabulary.name,
+			'mentions': list(self),
+			'entity_ids': [self._entity_ids[row] for row in self._rows.values()],
+			'counts': [self._counts[row] for row in self._rows.values()],
+			'errors': [self._errors[row] for row in self._rows.values()] if self._capacity else None,
+		}
+
+	def __setstate__(
+		self,
+		state: dict,
+	) -> None:
+		vocabulary_name = state['vocabulary_name']
+		self.__init__(
+			state['capacity'],
+			Vocabulary.get_instance(vocabulary_name) if vocabulary_name is not None else Vocabulary(),
+		)
+		for slot, mention in enumerate(state['mentions']):
+			row = self._add_row(self._vocabulary.get_id(mention, create = True))
+			entity_ids = self._entity_ids[row] = state['entity_ids'][slot]
+			self._counts[row] = state['counts'][slot]
+			if self._capacity:
+				self._errors[row] = state['errors'][slot]
+			if len(entity_ids) > self._slot_index_threshold:
+				self._slots[row] = {
+					entityid: position
+					for position, entityid in enumerate(entity_ids)
+				}
@@ -1,4 +1,30 @@
+from EL.pem_indexers.pem_database import PemDatabase
+from EL.pem_indexers.pem_mmap_index import PemMmapIndex
+from EL.pem_indexers.mention_count_store import MentionCountStore
+from EL.pem_indexers.pem_quantization import quantize, dequantize, PEM_SCALE
+from EL.utils.lru_cache import LRUCache
+from EL.utils.vocabulary import Vocabulary
+from array import array
+import itertools
+import pickle
+import sys
+import os
+
 class PemController():
+	'''
+		Aggregates the p(e|m) indexes of attached pem_indexers.
+		Note:
+			Raw mention - entity counts are kept per source (pem_indexer class) in {self._source_counts} (MentionCountStore objects).
+			P(e|m) values ({self._pem}) and mention occurences ({self._mention_counts}) are derived from those counts lazily,
+			i.e. once requested after a count update. Merging new data (update_pem(), load_counts()) is therefore a count addition.
+			Sources are combined per mention ID by adding up their counts per KB entity ID, weighted by {source_weights}.
+			Mentions are referred to by their IDs in the shared mention Vocabulary ( Vocabulary.get_instance('mentions') ),
+			also used by the MentionCountStore objects of all pem_indexers, entities by their KB entity IDs.
+			{self._pem} holds mention ID as key and tuple( KB entity IDs: array('I'), p(e|m) values: array('H') ) as value,
+			ordered by p(e|m) (descending). P(e|m) values are uint16 fixed-point integers (see pem_quantization),
+			dequantized by lookup() and items().
+	'''
+
 	_instance = None
 
 	@staticmethod 
@@ -9,15 +35,33 @@ class PemController():
 	def __init__(
 		self,
 		entity_indexer: object,
-		datapath: object
+		datapath: object,
+		lookup_cache_size: int = 10000,
+		entities_per_mention_limit: int = 100,
+		pruning: dict = None,
+		source_weights: dict = None,
 	):
+		'''
+			entities_per_mention_limit: top entities (by count) kept per mention when deriving p(e|m) values (unlimited if None)
+			source_weights: pem_indexer class name as key, weight of its counts as value (1 if not present)
+				example: { 'WikiPemIndexer': 1, 'YagoPemIndexer': 0.5 }
+			pruning: keyword arguments of prune(), applied once all pem_indexers are aggregated (no pruning if None)
+				example: { 'min_mention_count': 2, 'min_prob': 0.001, 'top_k': 50 }
+		'''
 		assert not PemController._instance, \
 			f'Not allowing multiple instances of {self.__class__.__name__}'
 		self._entity_indexer = entity_indexer
 		self._datapath = datapath
 		self._pem_indexers  = []
-		self._mention_counts = {}
-		self._pem = {}
+		self._source_counts = {}							# pem_indexer class name as key, MentionCountStore (raw counts) as value
+		self._vocabulary = Vocabulary.get_instance('mentions')		# mention strings <-> mention IDs, shared w/ all MentionCountStore objects
+		self._mention_counts = {}							# derived from {self._source_counts}, mention ID as key
+		self._pem = {}										# derived from {self._source_counts}, mention ID as key, (entity IDs, quantized p(e|m) values) as value
+		self._pem_outdated = False							# {self._pem} has to be derived again
+		self._lookup_cache = LRUCache(lookup_cache_size)	# mention as key, entities sorted by p(e|m) as value
+		self._entities_per_mention_limit = entities_per_mention_limit
+		self._pruning = pruning or {}
+		self._source_weights = source_weights or {}
 		PemController._instance = self
 
 	@property	
@@ -66,13 +110,7 @@ class PemController():
 		assert len(self._pem_indexers), 'No PemIndexer objects have been attached. Use .attach() method.'
 		for pem_indexer in self._pem_indexers:
 			pem_indexer.build_pem_index()
-		# round p(e|m) value to 3 decimals
-		for mention in self._pem:
-			for entity in self._pem[mention]:
-				self._pem[mention][entity] = round(
-					self._pem[mention][entity],
-					3
-				)
+		self._refresh_pem()
 		print(
 			'P(e|m) index computed successfully.\n'
 			f'\tTotal distinct mentions: "{len(self._pem)}"'
@@ -86,50 +124,315 @@ class PemController():
 		'''
 			Desc:
 				Called externally, after a pem_indexer's successful build_pem_index() computation - on the pem_indexer's end.
-				Once all mention objects have retrieved their entities per pem_indexer, MentionToken.compute_pem() is called on each of them.
+				The pem_indexer's raw mention - entity counts are added to its source's counts in {self._source_counts},
+				p(e|m) values are derived from the (weighted) counts of all sources once requested.
+				Counts of a top-k (Space-Saving) pem_indexer are merged as exact counts, their max. overestimation is reported here only.
 		'''
 		assert pem_indexer.__class__.__bases__[0].__name__ == 'PemIndexerBase', 'Unexpected object as input - must be SubClass of PemIndexerBase'
 		if len(pem_indexer):
-			entities_per_mention_limit: int = 100
-			for mention in pem_indexer:
-				mention.compute_pem(entities_per_mention_limit)
-				if str(mention) not in self._pem:
-					self._mention_counts[str(mention)] = mention.occurences
-					self._pem[str(mention)] = {
-						str(entity): pem
-						for entity, pem in mention.items()
-					}
-				else:
-					# condition branch in case of len(self._pem_indexers) > 1
-					self._mention_counts[str(mention)] += mention.occurences
-					for entity, pem in mention.items():
-						if str(entity) in self._pem[str(mention)]:
-							self._pem[str(mention)][str(entity)] = min(
-								len(self._pem_indexers) / 2, # Ad-hoc approach for setting upper-bound
-								self._pem[str(mention)][str(entity)] + pem
-							)
-						else:
-							self._pem[str(mention)][str(entity)] = pem
+			self._merge_counts(pem_indexer.__class__.__name__, pem_indexer.mentions)
 			print(f'P(e|m) values have been computed successfully.')
+			if pem_indexer.mentions.capacity:
+				print(
+					f'\tTop-{pem_indexer.mentions.capacity} entity counting per mention (Space-Saving), '
+					f'max. count overestimation: "{pem_indexer.mentions.max_error()}"'
+				)
+
+	def _merge_counts(
+		self,
+		source: str,
+		entity_counts: MentionCountStore,
+	) -> None:
+		self._source_counts.setdefault(source, MentionCountStore()).merge(entity_counts)
+		self._pem_outdated = True
+		self._lookup_cache.clear()
+
+	def _compute_pem(self) -> None:
+		'''
+			Desc:
+				Derive {self._pem} and {self._mention_counts} from {self._source_counts}:
+					1. merge the counts of all sources per mention ID, weighted by {self._source_weights}
+						(counts of a mention found in a single source w/ weight 1 are used as is, w/o a copy)
+					2. per mention, keep the top {self._entities_per_mention_limit} entities (by weighted count),
+						occurences is the sum of their weighted counts and p(e|m) = count / occurences (quantized to uint16)
+		'''
+		rows = {}		# mention ID as key, tuple( entity IDs, (weighted) counts ) or dict( entityid -> weighted count ) as value
+		for source, source_counts in self._source_counts.items():
+			weight = self._source_weights.get(source, 1)
+			for mention_id in source_counts.mention_ids():
+				entity_ids, counts = source_counts.entities(mention_id)
+				if weight != 1:
+					counts = [weight * count for count in counts]
+				row = rows.get(mention_id)
+				if row is None:
+					rows[mention_id] = entity_ids, counts,
+					continue
+				if isinstance(row, tuple):
+					row = rows[mention_id] = dict(zip(*row))
+				for entityid, count in zip(entity_ids, counts):
+					row[entityid] = row.get(entityid, 0) + count
+		self._pem, self._mention_counts = {}, {}
+		top_k = self._entities_per_mention_limit
+		for mention_id, row in rows.items():
+			entity_ids, counts = (list(row), list(row.values())) if isinstance(row, dict) else row
+			slots = sorted(range(len(counts)), reverse = True, key = counts.__getitem__)[:top_k]
+			occurences = sum(counts[slot] for slot in slots)
+			if not occurences:
+				continue
+			self._mention_counts[mention_id] = round(occurences)
+			self._pem[mention_id] = (
+				array('I', [entity_ids[slot] for slot in slots]),
+				array('H', [quantize(counts[slot] / occurences) for slot in slots]),
+			)
+		self._pem_outdated = False
+
+	def _refresh_pem(self) -> None:
+		''' Derive p(e|m) values again (and apply {self._pruning} policies) if raw counts have been updated since. '''
+		if self._pem_outdated:
+			self._compute_pem()
+			if self._pruning:
+				self.prune(**self._pruning)
+			self._lookup_cache.clear()
+
+	def _get_entity_counts(
+		self,
+		mention_id: int,
+	) -> dict:
+		''' Return dict( entityid: int -> (weighted) raw count over all sources ) of {mention_id}. '''
+		entity_counts = {}
+		for source, source_counts in self._source_counts.items():
+			weight = self._source_weights.get(source, 1)
+			for entityid, count in zip(*(source_counts.entities(mention_id) or ((), ()))):
+				entity_counts[entityid] = entity_counts.get(entityid, 0) + weight * count
+		return entity_counts
+
+	def _get_index_size(self) -> tuple:
+		'''
+			Return tuple( mentions: int, mention - entity pairs: int, approx. memory of {self._pem} and {self._mention_counts} in bytes )
+			Objects shared among mentions (i.e. entity names) are accounted for once.
+		'''
+		seen, memory = set(), 0
+		for obj in itertools.chain(
+			(self._pem, self._mention_counts),
+			itertools.chain.from_iterable(self._mention_counts.items()),
+			itertools.chain.from_iterable((pem, *pem) for pem in self._pem.values()),
+		):
+			if id(obj) not in seen:
+				seen.add(id(obj))
+				memory += sys.getsizeof(obj)
+		return len(self._pem), sum(len(entity_ids) for entity_ids, _ in self._pem.values()), memory,
+
+	def prune(
+		self,
+		min_mention_count: int = None,
+		min_entity_count: float = None,
+		top_k: int = None,
+		min_prob: float = None,
+		cumulative_mass: float = None,
+	) -> object:
+		'''
+			Desc:
+				Drop rare mentions and low-probability entities from the aggregated p(e|m) index, print a size report before and after.
+				Kept p(e|m) values are not renormalized. Mentions left w/o any entity are dropped.
+			Input (a policy is not applied if None):
+				min_mention_count: drop mentions w/ fewer occurences
+				min_entity_count: drop entities w/ fewer (raw) mention - entity occurences
+				top_k: keep the {top_k} most probable entities per mention
+				min_prob: drop entities w/ p(e|m) < {min_prob}
+				cumulative_mass: keep the most probable entities per mention, until their share of the mention's total p(e|m) reaches {cumulative_mass}
+			Note:
+				Raw counts are kept, hence once new counts are merged, p(e|m) values are derived again
+				and pruned by the constructor's {pruning} policies only.
+			Usage:
+				pem_controller.prune(min_mention_count = 2, cumulative_mass = 0.95)
+		'''
+		assert cumulative_mass is None or 0 < cumulative_mass <= 1, 'Invalid cumulative mass'
+		self._refresh_pem()
+		size_before = self._get_index_size()
+		for mention_id in list(self._pem):
+			occurences = self._mention_counts[mention_id]
+			if min_mention_count is not None and occurences < min_mention_count:
+				del self._pem[mention_id], self._mention_counts[mention_id]
+				continue
+			entity_ids, pems = self._pem[mention_id]
+			slots = list(range(len(entity_ids)))		# ordered by p(e|m) (descending)
+			total_mass = sum(pems)
+			if min_entity_count is not None:
+				entity_counts = self._get_entity_counts(mention_id)
+				slots = [slot for slot in slots if entity_counts[entity_ids[slot]] >= min_entity_count]
+			if min_prob is not None:
+				slots = list(itertools.takewhile(lambda slot: dequantize(pems[slot]) >= min_prob, slots))
+			if cumulative_mass is not None and total_mass:
+				mass = 0
+				for enum_slot, slot in enumerate(slots, 1):
+					mass += pems[slot]
+					if mass / total_mass >= cumulative_mass:
+						slots = slots[:enum_slot]
+						break
+			slots = slots[:top_k]
+			if not slots:
+				del self._pem[mention_id], self._mention_counts[mention_id]
+			elif len(slots) < len(entity_ids):
+				# arrays built from lists are allocated exactly
+				self._pem[mention_id] = (
+					array('I', [entity_ids[slot] for slot in slots]),
+					array('H', [pems[slot] for slot in slots]),
+				)
+		# dicts do not shrink on deletion, copies are sized to their live entries
+		self._pem, self._mention_counts = dict(self._pem), dict(self._mention_counts),
+		self._lookup_cache.clear()
+		size_after = self._get_index_size()
+		print(
+			'P(e|m) index pruned successfully.'
+			+ ''.join(
+				f'\n\t{label}: "{before}" -> "{after}"'
+				for label, before, after in zip(
+					('Distinct mentions', 'Mention - entity pairs', 'Approx. memory (bytes)'),
+					size_before,
+					size_after,
+				)
+			)
+		)
+		return self
+
+	def lookup(
+		self,
+		mention: str,
+		top_k: int = None,
+		min_prob: float = None,
+	) -> list:
+		'''
+			Desc:
+				Return list( tuple(entity: str, pem: float) ) of {mention}, ordered by p(e|m) value (descending).
+				Sorted entity lists of the most recently queried mentions are kept in a bounded LRU cache,
+					see cache_info() for hit/miss statistics.
+			Input:
+				top_k: keep the {top_k} most probable entities only (unfiltered if None)
+				min_prob: drop entities w/ p(e|m) < {min_prob} (unfiltered if None)
+			Usage:
+				pem_controller.lookup('Ηνωμένο Βασίλειο', top_k = 10)
+		'''
+		self._refresh_pem()
+		entities = self._lookup_cache.get(mention)
+		if entities is None:
+			entities = list(self._get_entities(self._vocabulary.get_id(mention)))
+			self._lookup_cache[mention] = entities
+		if min_prob is not None:
+			entities = list(itertools.takewhile(lambda item: item[1] >= min_prob, entities))
+		return entities[:top_k]
+
+	def cache_info(self) -> dict:
+		'''
+			Return lookup() cache statistics: dict( hits, misses, hit_ratio, size, maxsize )
+		'''
+		return self._lookup_cache.info()
 
 	def reset_state(
 		self
 	) -> object:
 		self._pem_indexers  = []
+		self._source_counts = {}
 		self._mention_counts = {}
 		self._pem = {}
+		self._pem_outdated = False
+		self._lookup_cache.clear()
 		return self
 
-	def store(self) -> object:
+	def _get_entities(
+		self,
+		mention_id: int,
+	) -> iter:
+		'''
+			yield tuple(entity: str, pem: float) of {mention_id}, ordered by p(e|m) value (descending)
+		'''
+		if mention_id in self._pem:
+			for entityid, pem in zip(*self._pem[mention_id]):
+				yield str(self._entity_indexer[entityid]), dequantize(pem),
+
+	def items(self) -> iter:
+		'''
+			Similar to dict.items() generator
+			yield tuple(mention: str, occurences: int, dict( entity: str -> pem: float ))
+		'''
+		self._refresh_pem()
+		for mention_id in self._pem:
+			yield self._vocabulary[mention_id], self._mention_counts[mention_id], dict(self._get_entities(mention_id)),
+
+	def quantized_items(self) -> iter:
+		'''
+			yield tuple(mention: str, occurences: int, entity_ids: array('I'), pems: array('H'))
+			, where pems are p(e|m) values as multiples of 1 / PEM_SCALE, ordered by p(e|m) value (descending).
+		'''
+		self._refresh_pem()
+		for mention_id, (entity_ids, pems) in self._pem.items():
+			yield self._vocabulary[mention_id], self._mention_counts[mention_id], entity_ids, pems,
+
+	def store(
+		self,
+		filename: str = 'pem.db',
+	) -> object:
 		'''
 			Desc:
-				Store {self._pem} and {self._mention_counts} in db
+				Store {self._pem} and {self._mention_counts} in a local SQLite db ( datapath/generated/{filename} ).
+				Use PemDatabase(path).lookup(mention) for loading the stored p(e|m) index.
 		'''
 		path = self._datapath / 'generated'
 		path.mkdir(exist_ok = True)
-		##
-		# (To-be-filled) code block for storing 
-		# self._pem and self._mention_counts in local db
+		print(f'Storing P(e|m) index in "{path / filename}"...')
+		PemDatabase.write(path / filename, self.quantized_items(), self._entity_indexer, PEM_SCALE)
+		print('P(e|m) index stored successfully.')
+		return self
 
-		##
-		return self
\ No newline at end of file
+	def store_mmap(
+		self,
+		filename: str = 'pem.idx',
+	) -> object:
+		'''
+			Desc:
+				Store {self._pem} and {self._mention_counts} in a read-only binary index file ( datapath/generated/{filename} ).
+				Use PemMmapIndex(path).lookup(mention) for memory-mapping the stored p(e|m) index.
+		'''
+		path = self._datapath / 'generated'
+		path.mkdir(exist_ok = True)
+		print(f'Storing P(e|m) index in "{path / filename}"...')
+		PemMmapIndex.write(path / filename, self.quantized_items(), self._entity_indexer, PEM_SCALE)
+		print('P(e|m) index stored successfully.')
+		return self
+
+	def store_counts(
+		self,
+		filename: str = 'pem_counts.pickle',
+	) -> object:
+		'''
+			Desc:
+				Store the raw mention - entity counts per source {self._source_counts} ( datapath/generated/{filename} ),
+				so that new sources can be merged later w/o a full rebuild ( see load_counts() ).
+		'''
+		path = self._datapath / 'generated'
+		path.mkdir(exist_ok = True)
+		tmp_path = path / (filename + '.tmp')
+		with open(tmp_path, 'wb') as f:
+			pickle.dump(self._source_counts, f, protocol = pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp_path, path / filename)
+		print(f'Raw P(e|m) counts stored in "{path / filename}".')
+		return self
+
+	def load_counts(
+		self,
+		filename: str = 'pem_counts.pickle',
+	) -> object:
+		'''
+			Desc:
+				Add raw mention - entity counts stored by store_counts() ( datapath/generated/{filename} ) to {self._source_counts}.
+				P(e|m) values are derived again once requested.
+				Entity IDs must refer to the same KB ( {self._entity_indexer} ).
+			Usage:
+				pem_controller.load_counts().attach(new_pem_indexer).build_pem_index()
+		'''
+		path = self._datapath / 'generated' / filename
+		assert path.exists(), f'Invalid path {path}'
+		with open(path, 'rb') as f:
+			for source, entity_counts in pickle.load(f).items():
+				self._merge_counts(source, entity_counts)
+		print(f'Raw P(e|m) counts loaded from "{path}".')
+		return self
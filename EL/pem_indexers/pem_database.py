@@ -0,0 +1,132 @@
+import sqlite3
+
+class PemDatabase():
+	'''
+		Local SQLite p(e|m) database, written once by PemController.store() and loaded by any consumer.
+		Schema:
+			meta( key TEXT PRIMARY KEY, value INTEGER )				( 'pem_scale' )
+			mentions( id INTEGER PRIMARY KEY, mention TEXT, occurences INTEGER )
+			pem( mention_id INTEGER, entity TEXT, pem INTEGER )		( fixed-point p(e|m) value, multiple of 1 / pem_scale )
+		Usage:
+			with PemDatabase(path) as pem_db:
+				pem_db.lookup('Ηνωμένο Βασίλειο')
+	'''
+
+	_batch_size: int = 50000		# Rows per executemany() call
+
+	def __init__(
+		self,
+		path: object,
+	):
+		assert path.exists(), f'Invalid path {path}'
+		self._path = path
+		self._connection = sqlite3.connect(f'file:{path}?mode=ro', uri = True)
+		try:
+			row = self._connection.execute("SELECT value FROM meta WHERE key = 'pem_scale'").fetchone()
+		except sqlite3.OperationalError:
+			row = None		# databases w/o a meta table store p(e|m) values as REAL
+		self._pem_scale = row[0] if row else 1
+
+	@classmethod
+	def write(
+		cls,
+		path: object,
+		pem_items: iter,
+		entity_indexer: object,
+		pem_scale: int,
+	) -> None:
+		'''
+			Desc:
+				Bulk-load a p(e|m) index into a new SQLite file at {path} (any existing database is replaced).
+				Rows are inserted w/ batched executemany() calls in a single transaction,
+				indexes are created once all rows have been loaded.
+				KB entity IDs are stored as entity names (via {entity_indexer}).
+			Input:
+				pem_items: iter( tuple(mention: str, occurences: int, entity_ids: array('I'), pems: array('H')) )
+					, where pems are p(e|m) values as multiples of 1 / {pem_scale}
+		'''
+		for suffix in ('', '-wal', '-shm'):
+			path.with_name(path.name + suffix).unlink(missing_ok = True)
+		connection = sqlite3.connect(path, isolation_level = None)
+		try:
+			connection.execute('PRAGMA journal_mode = WAL')
+			connection.execute('PRAGMA synchronous = OFF')
+			connection.execute('BEGIN')
+			connection.execute('CREATE TABLE mentions (id INTEGER PRIMARY KEY, mention TEXT NOT NULL, occurences INTEGER NOT NULL)')
+			connection.execute('CREATE TABLE pem (mention_id INTEGER NOT NULL, entity TEXT NOT NULL, pem INTEGER NOT NULL)')
+			connection.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+			connection.execute("INSERT INTO meta VALUES ('pem_scale', ?)", (pem_scale, ))
+			mention_rows, pem_rows = [], []
+			for mention_id, (mention, occurences, entity_ids, pems) in enumerate(pem_items):
+				mention_rows.append((mention_id, mention, occurences))
+				pem_rows.extend(
+					(mention_id, str(entity_indexer[entityid]), pem)
+					for entityid, pem in zip(entity_ids, pems)
+				)
+				if len(pem_rows) >= cls._batch_size:
+					connection.executemany('INSERT INTO mentions VALUES (?, ?, ?)', mention_rows)
+					connection.executemany('INSERT INTO pem VALUES (?, ?, ?)', pem_rows)
+					mention_rows, pem_rows = [], []
+			connection.executemany('INSERT INTO mentions VALUES (?, ?, ?)', mention_rows)
+			connection.executemany('INSERT INTO pem VALUES (?, ?, ?)', pem_rows)
+			connection.execute('CREATE UNIQUE INDEX idx_mentions_mention ON mentions (mention)')
+			connection.execute('CREATE INDEX idx_pem_mention_id ON pem (mention_id)')
+			connection.execute('COMMIT')
+		except:
+			connection.execute('ROLLBACK')
+			raise
+		finally:
+			connection.close()
+
+	@property
+	def path(self) -> object:
+		return self._path
+
+	def lookup(
+		self,
+		mention: str,
+	) -> dict:
+		'''
+			Return dict( entity: str -> pem: float ) of {mention}, ordered by p(e|m) value (descending).
+			Unknown mentions return an empty dict.
+		'''
+		return {
+			entity: pem / self._pem_scale
+			for entity, pem in self._connection.execute(
+				'SELECT pem.entity, pem.pem FROM mentions JOIN pem ON pem.mention_id = mentions.id '
+				'WHERE mentions.mention = ? ORDER BY pem.pem DESC',
+				(mention, ),
+			)
+		}
+
+	def occurences(
+		self,
+		mention: str,
+	) -> int:
+		''' Return the mention count of {mention}, 0 if not present. '''
+		row = self._connection.execute(
+			'SELECT occurences FROM mentions WHERE mention = ?',
+			(mention, ),
+		).fetchone()
+		return row[0] if row else 0
+
+	def __len__(self) -> int:
+		return self._connection.execute('SELECT COUNT(*) FROM mentions').fetchone()[0]
+
+	def __contains__(
+		self,
+		mention: str,
+	) -> bool:
+		return self._connection.execute(
+			'SELECT 1 FROM mentions WHERE mention = ?',
+			(mention, ),
+		).fetchone() is not None
+
+	def close(self) -> None:
+		self._connection.close()
+
+	def __enter__(self) -> object:
+		return self
+
+	def __exit__(self, *args) -> None:
+		self.close()
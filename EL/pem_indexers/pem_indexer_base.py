@@ -1,7 +1,11 @@
 from EL.tokens.token_handler_service import TokenHandlerService
 from EL.tokens.tokens.mention_token import MentionToken
 from EL.pem_indexers.pem_controller import PemController
+from EL.pem_indexers.mention_count_store import MentionCountStore
+import pickle
+import time
 import abc
+import os
 
 class PemIndexerBase(metaclass=abc.ABCMeta):
 	'''
@@ -10,15 +14,27 @@ class PemIndexerBase(metaclass=abc.ABCMeta):
 			Implement Subclass for usage.
 			Subclasses must implement the build_pem_index() function.
 			Function build_pem_index() is responsible for counting entities per mention.
+			Long builds may call _save_checkpoint() periodically and _load_checkpoint() on start,
+			so that a crashed build can be resumed w/ {resume} = True.
+			If {entity_capacity} is set, at most {entity_capacity} entities are counted per mention (top-k heavy-hitter mode,
+			see MentionCountStore), which bounds memory for very common anchors. Exact counting is the default.
+			Count overestimations are reported at build time only ( PemController.update_pem() ),
+			PemController keeps the counts as exact, per-pair bounds remain available via {self.mentions}.errors(mention) until then.
 	'''
 	def __init__(
 		self, 
 		datapath: object,
+		resume: bool = False,
+		checkpoint_interval: float = 600,
+		entity_capacity: int = None,
 	):
 		self._datapath = datapath 									# Path object
 		self._pem_controller = PemController.get_instance()			# many( PemIndexers )-to-one( PemController ) relation
 		self._mention_builder = TokenHandlerService(MentionToken)	# Used for constructing MentionToken objects
-		self._mentions: dict = {}									# text_fragment as key, MentionToken as value
+		self._mentions = MentionCountStore(entity_capacity)			# mention ID (shared mention Vocabulary) as key, entity IDs and counts as value
+		self._resume = resume										# Resume build_pem_index() from the last checkpoint (if any)
+		self._checkpoint_interval = checkpoint_interval				# Min. seconds between two checkpoints
+		self._last_checkpoint_time = time.monotonic()
 
 	@abc.abstractmethod	
 	def build_pem_index(
@@ -31,23 +47,106 @@ class PemIndexerBase(metaclass=abc.ABCMeta):
 		return self._datapath
 
 	@property
-	def mentions(self):
+	def mentions(self) -> MentionCountStore:
 		return self._mentions
-	
+
+	@property
+	def checkpoint_path(self) -> object:
+		return self._datapath / f'{self.__class__.__name__}.checkpoint'
+
+	def _load_checkpoint(self) -> object:
+		'''
+			Desc:
+				If {self._resume} is True and a checkpoint exists, restore {self._mentions} from it and return its build progress.
+				Otherwise return None.
+		'''
+		if not (self._resume and self.checkpoint_path.exists()):
+			return None
+		with open(self.checkpoint_path, 'rb') as f:
+			checkpoint = pickle.load(f)
+		assert checkpoint['mentions'].capacity == self._mentions.capacity, \
+			f'Checkpoint "{self.checkpoint_path}" was built w/ a different entity capacity'
+		self._mentions = checkpoint['mentions']
+		print(
+			f'Resuming from checkpoint "{self.checkpoint_path}"...\n'
+			f'\tCheckpoint mentions: "{len(self._mentions)}"'
+		)
+		return checkpoint['progress']
+
+	def _save_checkpoint(
+		self,
+		progress: object,
+		force: bool = False,
+	) -> None:
+		'''
+			Desc:
+				Store {self._mentions} and the subclass-specific build {progress} (written atomically),
+				unless less than {self._checkpoint_interval} seconds have passed since the last checkpoint and {force} is False.
+				{progress} must describe exactly the input already counted in {self._mentions}.
+		'''
+		if not force and time.monotonic() - self._last_checkpoint_time < self._checkpoint_interval:
+			return
+		tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + '.tmp')
+		with open(tmp_path, 'wb') as f:
+			pickle.dump(
+				{
+					'mentions': self._mentions,
+					'progress': progress,
+				},
+				f,
+				protocol = pickle.HIGHEST_PROTOCOL,
+			)
+		os.replace(tmp_path, self.checkpoint_path)
+		self._last_checkpoint_time = time.monotonic()
+
+	def _remove_checkpoint(self) -> None:
+		''' Called once build_pem_index() has completed. '''
+		self.checkpoint_path.unlink(missing_ok = True)
+
+	def add_entity(
+		self,
+		mention: str,
+		entity: object,
+		count: int = 1,
+	) -> None:
+		'''
+			Desc:
+				Increase count of the {mention} - {entity} pair by {count}.
+				entity can either be an int (entity ID) or any subclass of BasicEntity.
+		'''
+		if not isinstance(entity, int):
+			entity = entity.entityid
+		self._mentions.add(mention, entity, count)
+
+	def _build_mention_token(
+		self,
+		mention: str,
+	) -> MentionToken:
+		'''
+			Desc:
+				Materialize a MentionToken object for {mention} from {self._mentions} entity IDs and counts.
+				Entity IDs are resolved via the KB entity index of {self._pem_controller}.
+		'''
+		entity_indexer = self._pem_controller.entity_indexer
+		mention_token = self._mention_builder.build_token(mention)
+		for entityid, count in zip(*self._mentions.entities(mention)):
+			mention_token[entity_indexer[entityid]] = count
+		return mention_token
+
 	def __getitem__(
 		self,
 		mention: object,
 	) -> MentionToken:
 		'''
-			Return either self._mentions[mention] value or None if not present in {self._mentions}
+			Return either a MentionToken object built from {self._mentions} or None if not present in {self._mentions}
 			Usage:
 				self[mention]
 				, where mention can either be an str object or a MentionToken object
 		'''
 		if isinstance(mention, MentionToken):
 			mention = mention.text_fragment
-		if isinstance(mention, str):
-			return self._mentions.get(mention, None)
+		if isinstance(mention, str) and mention in self._mentions:
+			return self._build_mention_token(mention)
 
 	def __setitem__(
 		self,
@@ -55,7 +154,7 @@ class PemIndexerBase(metaclass=abc.ABCMeta):
 		updated_mention: MentionToken,
 	) -> None:
 		'''
-			Assign MentionToken object to {self._mentions}.
+			Replace entity counts of mention in {self._mentions} w/ entity counts of updated_mention.
 			Usage:
 				self[mention] = new_mention
 				, where mention is either an str object or a MentionToken object and new_mention is a MentionToken object
@@ -63,7 +162,10 @@ class PemIndexerBase(metaclass=abc.ABCMeta):
 		if isinstance(mention, MentionToken):
 			mention = mention.text_fragment
 		if isinstance(mention, str) and isinstance(updated_mention, MentionToken):
-			self._mentions[mention] = updated_mention
+			if mention in self._mentions:
+				del self._mentions[mention]
+			for entity, count in updated_mention.items():
+				self._mentions.add(mention, entity.entityid, count)
 
 	def __delitem__(
 		self,
@@ -83,8 +185,11 @@ class PemIndexerBase(metaclass=abc.ABCMeta):
 		return len(self._mentions)
 
 	def __iter__(self) -> iter:
+		'''
+			MentionToken objects are built lazily, one mention at a time.
+		'''
 		for mention in self._mentions:
-			yield self._mentions[mention]
+			yield self._build_mention_token(mention)
 
 	def __contains__(
 		self,
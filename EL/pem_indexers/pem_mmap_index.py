@@ -0,0 +1,237 @@
+from array import array
+import struct
+import mmap
+import sys
+
+class PemMmapIndex():
+	'''
+		Read-only p(e|m) index file, written once by PemController.store_mmap() and opened w/ mmap by any consumer.
+		Lookups binary search the sorted mention keys directly in the mapped file, nothing is deserialized on load,
+		hence startup takes milliseconds and worker processes on the same host share the OS page cache.
+		File format (little-endian, every section is 8-byte aligned):
+			header:				magic | mention_count | mention_blob_size | pair_count | entity_count | title_blob_size | pem_scale
+			mention_offsets:	uint64[mention_count + 1]		( byte offsets into mention_blob )
+			mention_blob:		utf-8 mention keys, sorted
+			occurences:			uint64[mention_count]
+			pair_offsets:		uint64[mention_count + 1]		( row offsets into entity_ids / pems )
+			entity_ids:			uint32[pair_count]				( KB entity IDs, ordered by p(e|m) per mention )
+			pems:				uint16[pair_count]				( fixed-point p(e|m) values, multiples of 1 / pem_scale )
+			title_entity_ids:	uint32[entity_count]			( sorted )
+			title_offsets:		uint64[entity_count + 1]		( byte offsets into title_blob )
+			title_blob:			utf-8 entity titles
+		Usage:
+			with PemMmapIndex(path) as pem_index:
+				pem_index.lookup('Ηνωμένο Βασίλειο')
+	'''
+
+	_magic: bytes = b'PEMIDX02'
+	_header = struct.Struct('<8s6Q')
+
+	def __init__(
+		self,
+		path: object,
+	):
+		assert path.exists(), f'Invalid path {path}'
+		assert sys.byteorder == 'little', 'Unsupported platform byte order'
+		self._path = path
+		with open(path, 'rb') as f:
+			self._mmap = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		(
+			magic,
+			mention_count,
+			mention_blob_size,
+			pair_count,
+			entity_count,
+			title_blob_size,
+			self._pem_scale,
+		) = self._header.unpack_from(self._mmap, 0)
+		assert magic == self._magic, f'Invalid p(e|m) index file {path}'
+		self._view = memoryview(self._mmap)
+		self._offset = self._header.size
+		self._mention_offsets = self._section('Q', mention_count + 1)
+		self._mention_blob = self._section('B', mention_blob_size)
+		self._occurences = self._section('Q', mention_count)
+		self._pair_offsets = self._section('Q', mention_count + 1)
+		self._entity_ids = self._section('I', pair_count)
+		self._pems = self._section('H', pair_count)
+		self._title_entity_ids = self._section('I', entity_count)
+		self._title_offsets = self._section('Q', entity_count + 1)
+		self._title_blob = self._section('B', title_blob_size)
+
+	def _section(
+		self,
+		typecode: str,
+		length: int,
+	) -> memoryview:
+		''' Return a zero-copy typed view of the next section in the mapped file. '''
+		size = length * struct.calcsize(typecode)
+		section = self._view[self._offset : self._offset + size].cast(typecode)
+		self._offset += size + (-size % 8)
+		return section
+
+	@classmethod
+	def _write_section(
+		cls,
+		f: object,
+		data: bytes,
+	) -> None:
+		f.write(data)
+		f.write(b'\0' * (-len(data) % 8))
+
+	@classmethod
+	def write(
+		cls,
+		path: object,
+		pem_items: iter,
+		entity_indexer: object,
+		pem_scale: int,
+	) -> None:
+		'''
+			Desc:
+				Write a p(e|m) index into a new binary index file at {path}.
+				Along w/ KB entity IDs, an entity ID -> title table is stored (titles via {entity_indexer}).
+			Input:
+				pem_items: iter( tuple(mention: str, occurences: int, entity_ids: array('I'), pems: array('H')) )
+					, ordered by p(e|m) value (descending), where pems are p(e|m) values as multiples of 1 / {pem_scale}
+		'''
+		rows = [
+			(mention.encode('utf-8'), occurences, row_entity_ids, row_pems)
+			for mention, occurences, row_entity_ids, row_pems in pem_items
+		]
+		rows.sort(key = lambda row: row[0])
+		mention_offsets, occurences, pair_offsets = array('Q', [0]), array('Q'), array('Q', [0])
+		entity_ids, pems = array('I'), array('H')
+		for mention, mention_occurences, row_entity_ids, row_pems in rows:
+			mention_offsets.append(mention_offsets[-1] + len(mention))
+			occurences.append(mention_occurences)
+			entity_ids.extend(row_entity_ids)
+			pems.extend(row_pems)
+			pair_offsets.append(len(entity_ids))
+		title_entity_ids = array('I', sorted(set(entity_ids)))
+		encoded_titles = [str(entity_indexer[entityid]).encode('utf-8') for entityid in title_entity_ids]
+		title_offsets = array('Q', [0])
+		for title in encoded_titles:
+			title_offsets.append(title_offsets[-1] + len(title))
+		mention_blob = b''.join(row[0] for row in rows)
+		title_blob = b''.join(encoded_titles)
+		with open(path, 'wb') as f:
+			f.write(
+				cls._header.pack(
+					cls._magic,
+					len(rows),
+					len(mention_blob),
+					len(entity_ids),
+					len(title_entity_ids),
+					len(title_blob),
+					pem_scale,
+				)
+			)
+			for section in (
+				mention_offsets,
+				mention_blob,
+				occurences,
+				pair_offsets,
+				entity_ids,
+				pems,
+				title_entity_ids,
+				title_offsets,
+				title_blob,
+			):
+				cls._write_section(f, bytes(section))
+
+	@property
+	def path(self) -> object:
+		return self._path
+
+	def _get_mention_index(
+		self,
+		mention: str,
+	) -> int:
+		''' Binary search {mention} in sorted mention keys, return its index or -1. '''
+		key = mention.encode('utf-8')
+		lo, hi = 0, len(self._occurences)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			candidate = self._mention_blob[self._mention_offsets[mid] : self._mention_offsets[mid + 1]].tobytes()
+			if candidate < key:
+				lo = mid + 1
+			elif candidate > key:
+				hi = mid
+			else:
+				return mid
+		return -1
+
+	def _get_title(
+		self,
+		entityid: int,
+	) -> str:
+		''' Binary search {entityid} in the entity ID -> title table. '''
+		lo, hi = 0, len(self._title_entity_ids)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self._title_entity_ids[mid] < entityid:
+				lo = mid + 1
+			else:
+				hi = mid
+		return self._title_blob[self._title_offsets[lo] : self._title_offsets[lo + 1]].tobytes().decode('utf-8')
+
+	def lookup_ids(
+		self,
+		mention: str,
+	) -> list:
+		'''
+			Return list( tuple(entityid: int, pem: float) ) of {mention}, ordered by p(e|m) value (descending).
+			Unknown mentions return an empty list.
+		'''
+		index = self._get_mention_index(mention)
+		if index < 0:
+			return []
+		start, end = self._pair_offsets[index], self._pair_offsets[index + 1]
+		return [
+			(entityid, pem / self._pem_scale)
+			for entityid, pem in zip(self._entity_ids[start:end], self._pems[start:end])
+		]
+
+	def lookup(
+		self,
+		mention: str,
+	) -> dict:
+		'''
+			Return dict( entity: str -> pem: float ) of {mention}, ordered by p(e|m) value (descending).
+			Unknown mentions return an empty dict.
+		'''
+		return {
+			self._get_title(entityid): pem
+			for entityid, pem in self.lookup_ids(mention)
+		}
+
+	def occurences(
+		self,
+		mention: str,
+	) -> int:
+		''' Return the mention count of {mention}, 0 if not present. '''
+		index = self._get_mention_index(mention)
+		return self._occurences[index] if index >= 0 else 0
+
+	def __len__(self) -> int:
+		return len(self._occurences)
+
+	def __contains__(
+		self,
+		mention: str,
+	) -> bool:
+		return self._get_mention_index(mention) >= 0
+
+	def close(self) -> None:
+		# typed section views must be released before their parent view and the mapping itself
+		for attribute in vars(self).values():
+			if isinstance(attribute, memoryview) and attribute is not self._view:
+				attribute.release()
+		self._view.release()
+		self._mmap.close()
+
+	def __enter__(self) -> object:
+		return self
+
+	def __exit__(self, *args) -> None:
+		self.close()
@@ -0,0 +1,15 @@
+'''
+	P(e|m) values are stored as fixed-point uint16 integers (array typecode 'H'), i.e. multiples of 1 / PEM_SCALE,
+	in memory (PemController) and in both persisted index formats (PemDatabase, PemMmapIndex).
+	Values are dequantized on lookup.
+'''
+
+PEM_DECIMALS: int = 3
+PEM_SCALE: int = 10 ** PEM_DECIMALS
+
+def quantize(pem: float) -> int:
+	''' Rounds exactly like round(pem, PEM_DECIMALS), i.e. dequantize(quantize(pem)) == round(pem, PEM_DECIMALS). '''
+	return round(round(pem, PEM_DECIMALS) * PEM_SCALE)
+
+def dequantize(value: int) -> float:
+	return value / PEM_SCALE
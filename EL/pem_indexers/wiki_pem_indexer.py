@@ -1,206 +1,394 @@
-from REL.pem_indexers.pem_indexer_base import PemIndexerBase
+from EL.pem_indexers.pem_indexer_base import PemIndexerBase
 from urllib.parse import unquote
-import json
+import multiprocessing
+import hashlib
+import pickle
+import mmap
+import os
+import re
+
+# Hyperlinks as generated by WikiExtractor ( "--links" ), scanned as raw utf-8 bytes:
+#	<a href="{quoted entityname}">{mention}</a>
+#	«a href="{quoted entityname}">{mention}</a»		(WikiExtractor code: "string.replace('<<', '«').replace('>>', '»')")
+_link_pattern = re.compile(
+	rb'<a href="(.*?)">(.*?)</a>'
+	rb'|\xc2\xaba href="(.*?)">(.*?)</a\xc2\xbb',
+	re.DOTALL,
+)
+
+def _scan_links(
+	buffer: object,
+	start: int,
+	end: int,
+) -> iter:
+	'''
+		Desc:
+			Zero-copy hyperlink scanner over the [start, end) byte range of a bytes-like {buffer} (i.e. mmap object).
+			for each document ( "</doc>" delimited ):
+				for each hyperlink ( single compiled regex pass, both valid and semivalid formats ):
+					decode href slice - use as entity
+					decode text slice - use as mention
+			Only the href and mention slices are ever copied and decoded.
+		Link example:
+			... <a href="
+				%CE%BD%CE%B5%CE%BF%CE%B3%CE%BF%CF%84%CE%B8%CE%B9%CE%BA%CE%AE%20%CE%B1%CF%81%CF%87%CE%B9%CF%84%CE%B5%CE%BA%CF%84%CE%BF%CE%BD%CE%B9%CE%BA%CE%AE
+			">ανανεωμένο ενδιαφέρο</a> ...
+			where:
+				entity: %CE%BD%CE%B5%CE%BF%CE%B3%CE%BF%CF%84%CE%B8%CE%B9%CE%BA%CE%AE%20%CE%B1%CF%81%CF%87%CE%B9%CF%84%CE%B5%CE%BA%CF%84%CE%BF%CE%BD%CE%B9%CE%BA%CE%AE
+				mention: ανανεωμένο ενδιαφέρο
+		Yield:
+			tuple(mention: str, entityname: str)
+	'''
+	while start < end:
+		document_end = buffer.find(b'\n</doc>', start, end)
+		document_end = end if document_end == -1 else document_end + 1
+		for match in _link_pattern.finditer(buffer, start, document_end):
+			if match.lastindex > 2:
+				href, mention = match.group(3, 4)
+			else:
+				href, mention = match.group(1, 2)
+			yield mention.decode('utf-8'), unquote(href.decode('utf-8')),
+		start = document_end + len(b'</doc>')
+
+def _cap_link_counts(
+	link_counts: dict,
+	capacity: int,
+	mentions: iter = None,
+) -> dict:
+	'''
+		Desc:
+			Keep the top {capacity} entities (by count) per mention of raw hyperlink counts {link_counts}, in place.
+			Only mentions in {mentions} are checked, if given. No-op if {capacity} is None (exact counting).
+	'''
+	if capacity:
+		for mention in (link_counts if mentions is None else mentions):
+			entity_counts = link_counts[mention]
+			if len(entity_counts) > capacity:
+				link_counts[mention] = dict(
+					sorted(entity_counts.items(), reverse = True, key = lambda item: item[1])[:capacity]
+				)
+	return link_counts
+
+def _parse_byte_range(
+	task: tuple,
+) -> tuple:
+	'''
+		Desc:
+			Worker function - parse the [start, end) byte range of a memory-mapped extracted wikidump file.
+			Byte ranges are aligned on "</doc>" lines (see WikiPemIndexer._get_byte_ranges()),
+			hence each range consists of whole documents only.
+			Raw hyperlinks are counted before KB filtering, so that per-shard counts
+			remain valid when the KB entity index changes (see WikiPemIndexer._add_link_counts()).
+			If {capacity} is set, only the top {capacity} entities per mention are returned.
+		Input:
+			tuple(filepath: Path, start: int, end: int, capacity: int)
+		Return:
+			tuple(
+				filepath: Path,
+				start: int,
+				end: int,
+				dict(
+					mention_A: str -> dict( entityname_A: str -> count: int, ... ),
+					...
+				),
+			)
+	'''
+	filepath, start, end, capacity = task
+	link_counts = {}
+	with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as buffer:
+		for mention, entityname in _scan_links(buffer, start, end):
+			entity_counts = link_counts.setdefault(mention, {})
+			entity_counts[entityname] = entity_counts.get(entityname, 0) + 1
+	return filepath, start, end, _cap_link_counts(link_counts, capacity),
+
+def _get_file_hash(
+	filepath: object,
+	block_size: int = 16 * 1024 ** 2,
+) -> str:
+	''' Return sha1 hex digest of {filepath} content. '''
+	file_hash = hashlib.sha1()
+	with open(filepath, 'rb') as f:
+		for block in iter(lambda: f.read(block_size), b''):
+			file_hash.update(block)
+	return file_hash.hexdigest()
+
+def _get_shard_signature(
+	filepath: object,
+) -> tuple:
+	''' Return tuple(size, mtime_ns) of {filepath}. '''
+	stat = filepath.stat()
+	return stat.st_size, stat.st_mtime_ns,
 
 class WikiPemIndexer(PemIndexerBase):
 	'''
 		Class responsible for computing P( entity | mention ) using REL's customised WikiExtractor's generated files, once applied on a wikidump.
 		Subclass of PemIndexerBase and must therefore override PemIndexerBase' abstract build_index() funtion, depending on use-case.
+		Note:
+			Extracted files (shards) are split into byte ranges aligned on "</doc>" boundaries.
+			If {processes} > 1, ranges are parsed in parallel by a process pool,
+			regardless of how many files WikiExtractor generated (i.e. "--bytes 1G").
+			If {use_shard_cache} is True, raw hyperlink counts of each shard are stored next to it ( {shard}.pem_counts ),
+			keyed by the shard's size, mtime and content hash. Only changed or new shards are reparsed on subsequent builds.
+			If {entity_capacity} is set, raw counts are reduced to the top {entity_capacity} entities per mention
+			per byte range and again whenever a range is merged into its shard's counts, so that memory, checkpoints and shard caches
+			stay bounded while counting. Per-shard counts are then approximate: entities dropped from a range or a shard lose those counts.
+			Shard caches are only reused by builds w/ the same {entity_capacity}.
 	'''
 
-	def build_pem_index(self):
+	_shard_cache_suffix: str = '.pem_counts'
+
+	def __init__(
+		self,
+		datapath: object,
+		processes: int = 1,
+		chunk_size: int = 64 * 1024 ** 2,
+		use_shard_cache: bool = True,
+		resume: bool = False,
+		checkpoint_interval: float = 600,
+		entity_capacity: int = None,
+	):
+		super().__init__(
+			datapath,
+			resume,
+			checkpoint_interval,
+			entity_capacity,
+		)
+		assert processes > 0 and chunk_size > 0, 'Invalid input'
+		self._processes = processes				# Worker processes used for parsing byte ranges
+		self._chunk_size = chunk_size			# Approximate size (in bytes) of a single byte range
+		self._use_shard_cache = use_shard_cache	# Store / reuse per-shard raw hyperlink counts
+
+	def _get_byte_ranges(
+		self,
+		filepath: object,
+	) -> list:
 		'''
 			Desc:
-				Fill {self._mentions} with str mentions as keys and MentionToken objects as values.
-				MentionToken.add_entities() is used for filling mention objects with entities.
-				Finally, {self._pem_controller.update_pem(self)} is called for passing control to PemController, 
-					an object responsible for handling multiple p(e|m) indexes. (* Observer design pattern)
+				Split file into [start, end) byte ranges of roughly {self._chunk_size} bytes.
+				Each range ends right after a "</doc>" line (or at EOF), so no document is split between ranges.
+			Return:
+				list( tuple(start: int, end: int), ... )
 		'''
-
-		def _extract_link_info(document: str) -> tuple:
-			'''			
-				Desc:
-					for each document:
-						for each hyperlink:
-							use text as mention
-							use href as entity
-							if entity exists in KB:
-								create mention - entity pair
-				Link example:
-					... <a href="
-						%CE%BD%CE%B5%CE%BF%CE%B3%CE%BF%CF%84%CE%B8%CE%B9%CE%BA%CE%AE%20%CE%B1%CF%81%CF%87%CE%B9%CF%84%CE%B5%CE%BA%CF%84%CE%BF%CE%BD%CE%B9%CE%BA%CE%AE
-					">ανανεωμένο ενδιαφέρο</a> ...
-					where:
-						entity: %CE%BD%CE%B5%CE%BF%CE%B3%CE%BF%CF%84%CE%B8%CE%B9%CE%BA%CE%AE%20%CE%B1%CF%81%CF%87%CE%B9%CF%84%CE%B5%CE%BA%CF%84%CE%BF%CE%BD%CE%B9%CE%BA%CE%AE
-						mention: ανανεωμένο ενδιαφέρο
-				Return:
-					tuple(
-						list(
-							(mention_A: str, entityname_A: str, )
-							(mention_B: str, entityname_A: str, )
-							...
-							(mention_A: str, entityname_B: str, )
-						), 
-						int(failed_entity_matching_count),
-					)
-			'''
-			mention_entity_pairs, failed_entity_matching_count = [], 0
-			# WikiExtractor code: "string.replace('<<', '«').replace('>>', '»')"
-			consider_semivalid_format = any(case in document for case in ('«a href="', '</a»'))
-			if consider_semivalid_format:
-				link_index = min(
-					(
-						document.find(
-							f'{char}a href="'
-						) for char in (
-							'<', 
-							'«',
-						)
-					),
-					key= lambda x: x < 0
-				)
-			else: 
-				link_index = document.find('<a href="')
-			while link_index >= 0:
-				end_entity_index = document.find('">', link_index)
-				if document[link_index] == '«':
-					end_mention_index = document.find('</a»', end_entity_index)
-				else:
-					end_mention_index = document.find('</a>', end_entity_index)
-				if end_entity_index == -1 or end_mention_index == -1:
-					# invalid document format
+		byte_ranges = []
+		filesize = filepath.stat().st_size
+		with open(filepath, 'rb') as f:
+			start = 0
+			while start < filesize:
+				end = start + self._chunk_size
+				if end >= filesize:
+					byte_ranges.append((start, filesize))
 					break
-				mention = document[
-					end_entity_index + len('">') 
-					: end_mention_index
-				]
-				entityname = (
-					unquote(
-						document[
-							link_index + len('<a href="') 
-							: end_entity_index
-						]
-					)
-				)
-				# Filter w/ KB entities
-				entity_token = self._pem_controller.entity_indexer[entityname]
-				if entity_token:
-					mention_entity_pairs.append(
-						(
-							mention,
-							entity_token
-						)
-					)
-				else:
-					failed_entity_matching_count += 1
+				# move to the beginning of the next full line
+				f.seek(end - 1)
+				f.readline()
+				for line in iter(f.readline, b''):
+					if line.startswith(b'</doc>'):
+						break
+				end = f.tell()
+				byte_ranges.append((start, end))
+				start = end
+		return byte_ranges
+
+	def _get_shard_cache_path(
+		self,
+		filepath: object,
+	) -> object:
+		return filepath.with_name(filepath.name + self._shard_cache_suffix)
+
+	def _load_shard_counts(
+		self,
+		filepath: object,
+	) -> dict:
+		'''
+			Desc:
+				Return cached raw hyperlink counts of shard {filepath} if still valid, otherwise None.
+				Cache is valid if it was counted w/ the same entity capacity and the shard's size and mtime are unchanged,
+				or if its size is unchanged and its content hash matches (i.e. the shard was copied or touched).
+		'''
+		cache_path = self._get_shard_cache_path(filepath)
+		if not (self._use_shard_cache and cache_path.exists()):
+			return None
+		with open(cache_path, 'rb') as f:
+			shard_cache = pickle.load(f)
+		stat = filepath.stat()
+		if shard_cache['size'] != stat.st_size or shard_cache.get('capacity') != self._mentions.capacity:
+			return None
+		if shard_cache['mtime_ns'] != stat.st_mtime_ns:
+			if shard_cache['sha1'] != _get_file_hash(filepath):
+				return None
+			self._store_shard_counts(filepath, shard_cache['link_counts'], shard_cache['sha1'])
+		return shard_cache['link_counts']
+
+	def _store_shard_counts(
+		self,
+		filepath: object,
+		link_counts: dict,
+		sha1: str = None,
+	) -> None:
+		''' Store raw hyperlink counts of shard {filepath} next to it (written atomically). '''
+		if not self._use_shard_cache:
+			return
+		stat = filepath.stat()
+		shard_cache = {
+			'size': stat.st_size,
+			'mtime_ns': stat.st_mtime_ns,
+			'sha1': sha1 or _get_file_hash(filepath),
+			'capacity': self._mentions.capacity,
+			'link_counts': link_counts,
+		}
+		cache_path = self._get_shard_cache_path(filepath)
+		tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+		with open(tmp_path, 'wb') as f:
+			pickle.dump(shard_cache, f, protocol = pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp_path, cache_path)
+
+	def _add_link_counts(
+		self,
+		link_counts: dict,
+		resolved_entityids: dict,
+	) -> tuple:
+		'''
+			Desc:
+				Filter raw hyperlink counts w/ KB entities and add them to {self._mentions}.
+				{resolved_entityids} (entityname -> entityid or None) memoizes KB lookups across shards.
+			Return:
+				tuple( int(valid_hyperlink_count), int(invalid_hyperlink_count) )
+		'''
+		entity_indexer = self._pem_controller.entity_indexer
+		valid_hyperlink_count, invalid_hyperlink_count = 0, 0
+		for mention, entity_counts in link_counts.items():
+			for entityname, count in entity_counts.items():
+				if entityname not in resolved_entityids:
+					entity_token = entity_indexer[entityname]
+					resolved_entityids[entityname] = entity_token.entityid if entity_token else None
+				entityid = resolved_entityids[entityname]
+				if entityid is None:
+					invalid_hyperlink_count += count
 					# print('Entity not matched: {}\nMention: {}\n'.format(entityname, mention))
-				link_index = min(
-					(
-						document.find(
-							f'{char}a href="',
-							end_mention_index + len("</a>")
-						) for char in (
-							'<', 
-							'«',
-						)
-					),
-					key= lambda x: x < 0
-				) if consider_semivalid_format else document.find(
-					'<a href="',
-					end_mention_index + len("</a>")
-				)
-			return mention_entity_pairs, failed_entity_matching_count,
-
-		def _groupby_mention_generator(mention_entity_pairs: list) -> iter:
-			'''
-				MentionToken object ( aggregated entities incl. ) generator
-
-				Desc:
-					for each mention: str, entity: WikipediaEntity in mention-entity pairs:
-						(
-							if new mention:
-								create MentionToken object
-						)
-						add entity to mention
-
-				Example:
-					input:
-						(mention_A: str, Entity_A: WikipediaEntity, )
-						(mention_B: str, Entity_A: WikipediaEntity, )
-						(mention_A: str, Entity_B: WikipediaEntity, )
-						(mention_A: str, Entity_A: WikipediaEntity, )
-					output:
-						yield 0:
-							mention_A: MentionToken
-								._entities{
-									Entity_A: 2,
-									Entity_B: 1,
-								}
-						yield 1:
-							mention_B: MentionToken
-								._entities{
-									Entity_A: 1,
-								}
-			'''
-			mentions = {}
-			for mention, entity in mention_entity_pairs:
+					continue
+				valid_hyperlink_count += count
 				if mention.strip():	# not empty after removing spaces
-					if mention not in mentions:
-						mentions[mention] = self._mention_builder.build_token(mention)
-					mentions[mention].add_entities(entity)
-			for mention in mentions:
-				yield mentions[mention]
+					self._mentions.add(mention, entityid, count)
+		return valid_hyperlink_count, invalid_hyperlink_count,
 
-		valid_hyperlink_count, invalid_hyperlink_count = 0, 0
-		curr_document = []
+	def _complete_shard(
+		self,
+		filepath: object,
+		link_counts: dict,
+		progress: dict,
+		resolved_entityids: dict,
+	) -> None:
+		'''
+			Desc:
+				Add raw hyperlink counts of a fully parsed (or cached) shard to {self._mentions} and mark the shard as done in {progress}.
+		'''
+		valid_count, invalid_count = self._add_link_counts(link_counts, resolved_entityids)
+		progress['valid_hyperlink_count'] += valid_count
+		progress['invalid_hyperlink_count'] += invalid_count
+		progress['done_shards'][filepath] = _get_shard_signature(filepath)
+		progress['pending_shards'].pop(filepath, None)
+
+	def build_pem_index(self):
+		'''
+			Desc:
+				Fill {self._mentions} with str mentions as keys and KB entity IDs and counts as values.
+				Byte ranges of every changed or new shard are parsed (in parallel if {self._processes} > 1) into raw hyperlink counts,
+					unchanged shards are loaded from their cached counts instead.
+				Once all byte ranges of a shard are parsed, its counts are filtered w/ KB entities and added to {self._mentions} ( MentionCountStore.add() ).
+				Build progress (done shards, parsed byte ranges of pending shards) is checkpointed periodically
+					and restored if {self._resume} is True.
+				Finally, {self._pem_controller.update_pem(self)} is called for passing control to PemController,
+					an object responsible for handling multiple p(e|m) indexes. (* Observer design pattern)
+		'''
+		resolved_entityids = {}
 		folderpath_container = self._datapath / 'text'
 		assert folderpath_container.exists(), f'Invalid path: {folderpath_container}'
+		progress = self._load_checkpoint() or {
+			'valid_hyperlink_count': 0,
+			'invalid_hyperlink_count': 0,
+			'done_shards': {},		# shard filepath as key, shard signature as value
+			'pending_shards': {},	# shard filepath as key, dict( signature, range_count, done_ranges, link_counts ) as value
+		}
 		print(
 			'Parsing extracted wikidump...\n\n' + '-' * 8
 		)
-		for filepath in folderpath_container.glob('*/*'):
-			if filepath.is_file():
-				with open(
-					filepath,
-					'r',
-					encoding='utf-8'
-				) as f:
-					print(f'Parsing file "{filepath.name}"...')
-					for enum_line, line in enumerate(f, 1):
-						if line.startswith('<doc id="'):
-							# line has form:
-							# <doc id="{ENTITY_ID}" url="{ENTITY_URL}" title="{ENTITY_NAME}">
-							curr_doc_id = int(line[len('<doc id="') : line.find('" ')])
-							# print(doc_id)
-							continue
-						else:
-							curr_document.append(line)
-						if line.startswith('</doc>'):
-							# line has form:
-							# </doc>
-							mention_entity_pairs, failed_entity_matching_count = _extract_link_info(
-								' '.join(curr_document)
-							)
-							valid_hyperlink_count += len(mention_entity_pairs)
-							invalid_hyperlink_count += failed_entity_matching_count
-							for mention in _groupby_mention_generator(mention_entity_pairs):
-								if mention.text_fragment in self._mentions:
-									self._mentions[mention.text_fragment].add_entities(mention)
-								else:
-									self._mentions[mention.text_fragment] = mention
-							curr_document = []
-						if enum_line % 500000 == 0:
-							print(
-								f'\tProcessed "{enum_line}" lines, '
-								'valid hyperlinks: "{valid_hyperlink_count}", '
-								'failed entity links: "{invalid_hyperlink_count}"'
-							)
+		shards = [
+			filepath
+			for filepath in sorted(folderpath_container.glob('*/*'))
+			if filepath.is_file() and self._shard_cache_suffix not in filepath.name
+		]
+		tasks = []
+		for filepath in shards:
+			signature = _get_shard_signature(filepath)
+			if filepath in progress['done_shards']:
+				if progress['done_shards'][filepath] != signature:
+					print(f'Warning: shard "{filepath.parent.name}/{filepath.name}" changed after being checkpointed, checkpointed counts are kept.')
+				continue
+			link_counts = self._load_shard_counts(filepath)
+			if link_counts is not None:
+				print(f'Loaded cached hyperlink counts of shard "{filepath.parent.name}/{filepath.name}".')
+				self._complete_shard(filepath, link_counts, progress, resolved_entityids)
+				continue
+			byte_ranges = self._get_byte_ranges(filepath)
+			pending_shard = progress['pending_shards'].get(filepath, None)
+			if not pending_shard or pending_shard['signature'] != signature:
+				pending_shard = progress['pending_shards'][filepath] = {
+					'signature': signature,
+					'range_count': len(byte_ranges),
+					'done_ranges': set(),
+					'link_counts': {},
+				}
+			if len(pending_shard['done_ranges']) == pending_shard['range_count']:
+				# i.e. empty shard
+				self._store_shard_counts(filepath, pending_shard['link_counts'])
+				self._complete_shard(filepath, pending_shard['link_counts'], progress, resolved_entityids)
+				continue
+			tasks.extend(
+				(filepath, start, end, self._mentions.capacity)
+				for start, end in byte_ranges
+				if (start, end) not in pending_shard['done_ranges']
+			)
+		self._save_checkpoint(progress)
+		print(
+			f'Parsing "{len(tasks)}" byte ranges of "{len(progress["pending_shards"])}/{len(shards)}" changed shards '
+			f'using "{self._processes}" process(es)...'
+		)
+		if self._processes > 1:
+			pool = multiprocessing.Pool(self._processes)
+			results = pool.imap_unordered(_parse_byte_range, tasks)
+		else:
+			pool = None
+			results = map(_parse_byte_range, tasks)
+		try:
+			for enum_task, (filepath, start, end, range_link_counts) in enumerate(results, 1):
+				pending_shard = progress['pending_shards'][filepath]
+				pending_shard['done_ranges'].add((start, end))
+				for mention, entity_counts in range_link_counts.items():
+					shard_entity_counts = pending_shard['link_counts'].setdefault(mention, {})
+					for entityname, count in entity_counts.items():
+						shard_entity_counts[entityname] = shard_entity_counts.get(entityname, 0) + count
+				_cap_link_counts(pending_shard['link_counts'], self._mentions.capacity, range_link_counts)
+				if len(pending_shard['done_ranges']) == pending_shard['range_count']:
+					# all byte ranges of the shard have been parsed
+					self._store_shard_counts(filepath, pending_shard['link_counts'])
+					self._complete_shard(filepath, pending_shard['link_counts'], progress, resolved_entityids)
+				self._save_checkpoint(progress)
+				print(
+					f'\tProcessed "{enum_task}/{len(tasks)}" byte ranges, '
+					f'valid hyperlinks: "{progress["valid_hyperlink_count"]}", '
+					f'failed entity links: "{progress["invalid_hyperlink_count"]}"'
+				)
+		finally:
+			if pool:
+				pool.close()
+				pool.join()
 		print(
 			'-' * 8 + '\n\n'
 			'Parsed extracted wikidump successfully.\n'
-			f'\tTotal valid links: {valid_hyperlink_count}\n'
-			f'\tTotal invalid links: {invalid_hyperlink_count}\n'
+			f'\tTotal valid links: {progress["valid_hyperlink_count"]}\n'
+			f'\tTotal invalid links: {progress["invalid_hyperlink_count"]}\n'
 			'Computing Wikipedia P(e|m) values...'
 		)
 		self._pem_controller.update_pem(self)
+		self._remove_checkpoint()
 
@@ -1,4 +1,5 @@
 from EL.pem_indexers.pem_indexer_base import PemIndexerBase
+import itertools
 
 class YagoPemIndexer(PemIndexerBase):
 	'''
@@ -10,36 +11,48 @@ class YagoPemIndexer(PemIndexerBase):
 	def build_pem_index(self):
 		'''
 			Desc:
-				Fill {self._mentions} with str mentions as keys and MentionToken objects as values.
-				MentionToken.add_entities() is used for filling mention objects with entities.
+				Fill {self._mentions} with str mentions as keys and KB entity IDs and counts as values.
+				PemIndexerBase.add_entity() is used for counting mention - entity pairs.
+				Number of processed lines is checkpointed periodically and restored if {self._resume} is True.
 				Finally, {self._pem_controller.update_pem(self)} is called for passing control to PemController, 
 					an object responsible for handling multiple p(e|m) indexes. (* Observer design pattern)
 		'''
-
-		valid_entity_count, invalid_entity_count = 0, 0
+		progress = self._load_checkpoint() or {
+			'line_count': 0,
+			'valid_entity_count': 0,
+			'invalid_entity_count': 0,
+		}
+		valid_entity_count, invalid_entity_count = progress['valid_entity_count'], progress['invalid_entity_count']
 		filepath = self._datapath / 'yago_means.tsv'
 		with open(
-			self._datapath,
+			filepath,
 			'r',
 			encoding='utf-8'
 		) as f:
-			for enum_line, line in enumerate(f):
+			# skip lines already counted in the restored checkpoint
+			lines = itertools.islice(f, progress['line_count'], None)
+			for enum_line, line in enumerate(lines, progress['line_count']):
 				mention, wikipedia_entity = line.strip().split('\t')
 				mention = mention[1:-4] # example: '"γαλαξίας"@el'
 				# Filter w/ KB entities
 				entity_token = self._pem_controller.entity_indexer[wikipedia_entity]
 				if entity_token and mention:
-					if mention not in self._mentions:
-						self._mentions[mention] = self._mention_builder.build_token(mention)
-					self._mentions[mention].add_entities(entity_token)
+					self.add_entity(mention, entity_token)
 					valid_entity_count += 1
 				else:
 					invalid_entity_count += 1
 
-			if enum_line % 50000 == 0:
-				print(
-					f'\tProcessed "{enum_line}" lines, valid hyperlinks: "{valid_entity_count}", failed entity links: "{invalid_entity_count}"'
-				)
+				if enum_line % 50000 == 0:
+					print(
+						f'\tProcessed "{enum_line}" lines, valid hyperlinks: "{valid_entity_count}", failed entity links: "{invalid_entity_count}"'
+					)
+					self._save_checkpoint(
+						{
+							'line_count': enum_line + 1,
+							'valid_entity_count': valid_entity_count,
+							'invalid_entity_count': invalid_entity_count,
+						}
+					)
 		print(
 			'-' * 8 + '\n\n'
 			'Parsed yago_means.tsv file successfully.\n'
@@ -48,3 +61,4 @@ class YagoPemIndexer(PemIndexerBase):
 			'Computing YAGO P(e|m) values...'
 		)
 		self._pem_controller.update_pem(self)
+		self._remove_checkpoint()
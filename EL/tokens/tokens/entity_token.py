@@ -6,6 +6,8 @@ class BasicEntity(TokenBase):
 		Subclass of TokenBase
 	'''
 
+	__slots__ = ('_entityid', '_hash', )
+
 	def __init__(
 		self,
 		entityname: str,
@@ -14,14 +16,24 @@ class BasicEntity(TokenBase):
 		assert entityid >= 0, 'Invalid Entity ID'
 		super().__init__(entityname)
 		self._entityid = entityid
+		self._update_hash()
 
-	def __hash__(self) -> hash:
+	def _compute_hash(self) -> int:
 		'''
-			Entity objects are used as dictionary keys (for p(e|m) computation) and must therefore provide a hash key.
 			Based on Python 3.6 documention a hash function is most efficient when used on a tuple.
 		'''
 		return hash((self._text_fragment, self._entityid))
 
+	def _update_hash(self) -> None:
+		self._hash = self._compute_hash()
+
+	def __hash__(self) -> hash:
+		'''
+			Entity objects are used as dictionary keys (for p(e|m) computation) and must therefore provide a hash key.
+			The hash value is computed once (at construction or once a hashed field changes) and cached in {self._hash}.
+		'''
+		return self._hash
+
 	@property
 	def entityid(self) -> int:
 		return self._entityid
@@ -30,10 +42,12 @@ class BasicEntity(TokenBase):
 	def entityid(self, entityid: int) -> None:
 		if isinstance(entityid, int) and entityid >= 0:
 			self._entityid = entityid
+			self._update_hash()
 
 	@entityid.deleter
 	def entityid(self) -> None:
 		self._entityid = None
+		self._update_hash()
 
 	def __eq__(self, other: object) -> bool:
 		'''
@@ -46,7 +60,7 @@ class BasicEntity(TokenBase):
 			return self._text_fragment == other
 		elif isinstance(other, int):
 			return self._entityid == other
-		elif isubclass(type(other), BasicEntity):
+		elif issubclass(type(other), BasicEntity):
 			return (self._text_fragment, self._entityid) == (other._text_fragment, other._entityid)
 		return False
 
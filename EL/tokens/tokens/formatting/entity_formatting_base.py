@@ -1,13 +1,26 @@
 from EL.tokens.tokens.formatting.formatting_base import FormattingBase
+from EL.utils.lru_cache import LRUCache
 
 class EntityFormattingBase(FormattingBase):
+	'''
+		apply_rules() is memoized per class (bounded LRU cache), since the same mentions are formatted repeatedly on lookups.
+		normalize_many() bypasses the cache and is meant for bulk formatting of (mostly unique) KB entity titles.
+		Subclasses extend normalize(), the uncached rule chain.
+	'''
+
+	_memo_size: int = 100000
+	_memo = LRUCache(_memo_size)
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		cls._memo = LRUCache(cls._memo_size)	# one cache per formatting class
 
 	@classmethod
-	def apply_rules(
+	def normalize(
 		cls,
 		text_fragment: str,
-	) -> str:		
-		text_fragment = ' '.join(
+	) -> str:
+		return ' '.join(
 			text_fragment 				\
 			.replace('&amp;', r'&')		\
 			.replace('&quot;', r'"')	\
@@ -15,4 +28,21 @@ class EntityFormattingBase(FormattingBase):
 			.replace('_', r" ")			\
 			.split()
 		).lower()
-		return text_fragment
\ No newline at end of file
+
+	@classmethod
+	def apply_rules(
+		cls,
+		text_fragment: str,
+	) -> str:
+		formatted_text_fragment = cls._memo.get(text_fragment)
+		if formatted_text_fragment is None:
+			formatted_text_fragment = cls.normalize(text_fragment)
+			cls._memo[text_fragment] = formatted_text_fragment
+		return formatted_text_fragment
+
+	@classmethod
+	def normalize_many(
+		cls,
+		text_fragments: iter,
+	) -> list:
+		return [cls.normalize(text_fragment) for text_fragment in text_fragments]
@@ -1,20 +1,16 @@
-from EL.utils.helper_funcs import strip_accents, firstletter_greeklish_to_greek, remove_diactitical_marks
+from EL.utils.helper_funcs import strip_accents, firstletter_greeklish_to_greek, remove_diactitical_marks, CharTranslationTable
 from EL.tokens.tokens.formatting.entity_formatting_base import EntityFormattingBase
 
 class EntityFormattingEL(EntityFormattingBase):
-	_stacked_formatting_funcs = [
-			strip_accents,
-			remove_diactitical_marks,
-			firstletter_greeklish_to_greek,
-		]
+	# strip_accents and remove_diactitical_marks are applied per character, hence combined in a single translation table
+	_translation_table = CharTranslationTable(
+		lambda ch: remove_diactitical_marks(strip_accents(ch))
+	)
 
 	@classmethod
-	def apply_rules(
+	def normalize(
 		cls,
 		text_fragment: str,
-	) -> str:		
-		text_fragment = super().apply_rules(text_fragment)
-		for formatting_func in cls._stacked_formatting_funcs:
-			text_fragment = formatting_func(text_fragment)
-		return text_fragment
-
+	) -> str:
+		text_fragment = super().normalize(text_fragment).translate(cls._translation_table)
+		return firstletter_greeklish_to_greek(text_fragment)
@@ -5,11 +5,11 @@ class EntityFormattingEN(EntityFormattingBase):
 	]
 
 	@classmethod
-	def apply_rules(
+	def normalize(
 		cls,
 		text_fragment: str,
-	) -> str:		
-		text_fragment = super().apply_rules(text_fragment)
+	) -> str:
+		text_fragment = super().normalize(text_fragment)
 		for formatting_func in cls._stacked_formatting_funcs:
 			text_fragment = formatting_func(text_fragment)
 		return text_fragment
@@ -8,6 +8,8 @@ class MentionToken(TokenBase):
 		Such entity objects must be subclasses of the BasicEntity class.
 	'''
 
+	__slots__ = ('_entities', '_occurences', )
+
 	def __init__(
 		self,
 		text_fragment: str,
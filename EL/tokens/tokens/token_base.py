@@ -1,8 +1,12 @@
 class TokenBase():
 	'''
 		Base class for Tokens
+		Note:
+			Token classes declare __slots__ (no per-instance __dict__), since millions of tokens are held at once.
 	'''
 
+	__slots__ = ('_text_fragment', )
+
 	def __init__(
 		self,
 		text_fragment: str
@@ -20,12 +24,21 @@ class TokenBase():
 	) -> None:
 		if isinstance(text_fragment, str) and text_fragment:
 			self._text_fragment = text_fragment
+			self._update_hash()
 			
 	@text_fragment.deleter
 	def text_fragment(
 		self
 	) -> None:
 		self._text_fragment = ''
+		self._update_hash()
+
+	def _update_hash(self) -> None:
+		'''
+			Called whenever a field used for hashing changes.
+			Overridden by hashable subclasses that cache their hash value.
+		'''
+		pass
 
 	def __eq__(self, other: object) -> bool:
 		if isinstance(other, str):
@@ -8,16 +8,31 @@ class WikipediaEntity(BasicEntity):
 		A WikipediaEntity is a document present in the wiki dump
 	'''
 
+	__slots__ = ('_formatted_entityname', '_redirect_to_entityid', )
+
 	_lang = config_settings.get('language', None)
+	_formatting = {
+		'en': EntityFormattingEN,
+		'el': EntityFormattingEL,
+	}
 
 	def __init__(
 		self,
 		document_title: str,
 		document_id: int,
 		redirect_to_document_id: int = None,
+		formatted_entityname: str = None,
 	):
+		'''
+			{formatted_entityname} may be provided if already computed (i.e. loaded from a snapshot),
+			otherwise it is computed from {document_title} via format_text_fragment().
+		'''
 		super().__init__(document_title, document_id)
-		self._formatted_entityname = self.format_text_fragment(document_title)
+		self._formatted_entityname = (
+			formatted_entityname
+			if formatted_entityname is not None
+			else self.format_text_fragment(document_title)
+		)
 		self._entityid = document_id
 		self._redirect_to_entityid = redirect_to_document_id
 
@@ -27,15 +42,26 @@ class WikipediaEntity(BasicEntity):
 		text_fragment: str,
 	) -> str:
 		'''
-			Return simplified version of {text_fragment}.
+			Return simplified version of {text_fragment} (memoized).
 		'''
-		if cls._lang:
-			if cls._lang == 'en':
-				return EntityFormattingEN.apply_rules(text_fragment)
-			elif cls._lang == 'el':
-				return EntityFormattingEL.apply_rules(text_fragment)
+		formatting = cls._formatting.get(cls._lang, None)
+		if formatting:
+			return formatting.apply_rules(text_fragment)
 		return text_fragment
 
+	@classmethod
+	def format_text_fragments(
+		cls,
+		text_fragments: list,
+	) -> list:
+		'''
+			Return simplified versions of {text_fragments}, w/o memoization (bulk formatting of KB entity titles).
+		'''
+		formatting = cls._formatting.get(cls._lang, None)
+		if formatting:
+			return formatting.normalize_many(text_fragments)
+		return list(text_fragments)
+
 	@property
 	def formatted_entityname(self) -> str:
 		return self._formatted_entityname
@@ -62,7 +88,7 @@ class WikipediaEntity(BasicEntity):
 	def redirect_to_entityid(self) -> None:
 		self._redirect_to_entityid = None
 
-	def __hash__(self) -> hash:
+	def _compute_hash(self) -> int:
 		return hash(('wikipedia', self._text_fragment, self._entityid))
 
 	def __repr__(self) -> str:
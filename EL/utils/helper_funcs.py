@@ -1,5 +1,7 @@
+from EL.config import config_settings
 import unicodedata
-from nltk.corpus import stopwords
+import json
+import os
 # import re
 
 ########
@@ -20,6 +22,34 @@ def remove_diactitical_marks(
 		text_fragment = text_fragment.replace(diactitical_mark, '')
 	return text_fragment
 
+greek_alphabet = frozenset(
+	(
+		'α', 'β', 'γ', 'δ', 'ε', 'ζ', 'η', 'θ', 'ι', 'κ', 'λ', 'μ', 'ν', 'ξ', 'ο', 'π', 'ρ', 'σ', 'τ', 'υ' , 'φ', 'χ', 'ψ', 'ω'
+	)
+)
+greeklish_mapping = {
+	'a': 'α',
+	'b': 'β',
+	'e': 'ε',
+	'h': 'η',
+	'i': 'ι',
+	'k': 'κ',
+	'm': 'μ',
+	'n': 'ν',
+	'o': 'ο',
+	'p': 'ρ',
+	'q': 'ξ',
+	'r': 'ρ',		# (?)
+	's': 'σ',
+	't': 'τ',
+	'u': 'υ',		# (?)
+	'v': 'ν',		# υ (?)
+	'w': 'ω',
+	'x': 'χ',
+	'y': 'υ',
+	'z': 'ζ',
+}
+
 def firstletter_greeklish_to_greek(text_fragment: str):
 	'''
 		/ Custom approach /
@@ -41,36 +71,11 @@ def firstletter_greeklish_to_greek(text_fragment: str):
 			then:
 				transform the first letter to the respective greek one
 	'''
-	greek_alphabet = (
-		'α', 'β', 'γ', 'δ', 'ε', 'ζ', 'η', 'θ', 'ι', 'κ', 'λ', 'μ', 'ν', 'ξ', 'ο', 'π', 'ρ', 'σ', 'τ', 'υ' , 'φ', 'χ', 'ψ', 'ω'
-	)
-	greeklish_mapping = {
-		'a': greek_alphabet[0],		# α
-		'b': greek_alphabet[1],		# β
-		'e': greek_alphabet[4],		# ε
-		'h': greek_alphabet[6],		# η
-		'i': greek_alphabet[8],		# ι
-		'k': greek_alphabet[9],		# κ
-		'm': greek_alphabet[11],	# μ
-		'n': greek_alphabet[12],	# ν
-		'o': greek_alphabet[14],	# ο
-		'p': greek_alphabet[16],	# ρ
-		'q': greek_alphabet[13],	# ο
-		'r': greek_alphabet[16],	# ρ (?)
-		's': greek_alphabet[17],	# σ
-		't': greek_alphabet[18],	# τ
-		'u': greek_alphabet[19],	# υ (?)
-		'v': greek_alphabet[12],	# υ (?)
-		'w': greek_alphabet[23],	# ω
-		'x': greek_alphabet[21],	# χ
-		'y': greek_alphabet[19],	# υ
-		'z': greek_alphabet[5],		# ζ
-	}
 	if (
 		text_fragment.islower() 	# False if empty
 		and text_fragment[0] in greeklish_mapping 
-		and sum([ch in greeklish_mapping for ch in text_fragment]) == 1
-		and sum([ch in greek_alphabet for ch in text_fragment]) > 0
+		and greeklish_mapping.keys().isdisjoint(text_fragment[1:])
+		and not greek_alphabet.isdisjoint(text_fragment)
 	):
 		return greeklish_mapping[text_fragment[0]] + text_fragment[1:]
 	return text_fragment
@@ -109,6 +114,31 @@ def strip_accents(text_fragment: str) -> str:
 		]
 	)
 
+class CharTranslationTable(dict):
+	'''
+		str.translate() table, filled lazily w/ the result of {char_func} per (unicode) character.
+		Applies a per-character function (i.e. strip_accents, remove_diactitical_marks) on a whole str in a single pass,
+		while every distinct character is computed once.
+		Usage:
+			table = CharTranslationTable(strip_accents)
+			text_fragment.translate(table)
+	'''
+
+	def __init__(
+		self,
+		char_func: callable,
+	):
+		super().__init__()
+		self._char_func = char_func
+
+	def __missing__(
+		self,
+		codepoint: int,
+	) -> str:
+		result = self._char_func(chr(codepoint))
+		self[codepoint] = result
+		return result
+
 ########
 ########
 ######
@@ -120,6 +150,12 @@ def strip_accents(text_fragment: str) -> str:
 ########
 
 
+_stopword_langs = {
+	'el': 'greek',
+	'en': 'english',
+}
+_stopwords = {}			# lang as key, (normalized) stopwords frozenset as value
+
 def get_nltk_stopwords(lang = '') -> set:
 	'''
 		if lang = 'greek':
@@ -129,22 +165,50 @@ def get_nltk_stopwords(lang = '') -> set:
 		Note:
 			Roughly half of the Greek stopwords are invalid for Modern Greek. 
 			Most accents used and some of the words are Ancient Greek.
+			NLTK is imported lazily (on first use), since it is slow to import and not needed on the index build path.
 	'''
-
-	def get_lang(lang: str) -> str:
-		langs = {
-			'el': 'greek',
-			'en': 'english',
-		}
-		return langs.get(lang, '')
-
-	lang = get_lang(lang)
+	lang = _stopword_langs.get(lang, '')
 	if lang:
+		from nltk.corpus import stopwords
 		return {strip_accents(word.lower()) for word in stopwords.words(lang)}
 	return set()
 
+def store_stopwords(
+	path: str,
+	langs: iter = tuple(_stopword_langs),
+) -> None:
+	'''
+		Precompute (normalized) NLTK stopwords of {langs} into a json file at {path}: dict( lang -> list( stopword ) ).
+		Once config_settings['stopwords_path'] points to that file, get_stopwords() does not import NLTK at all.
+	'''
+	with open(path, 'w', encoding='utf-8') as f:
+		json.dump(
+			{lang: sorted(get_nltk_stopwords(lang)) for lang in langs},
+			f,
+			ensure_ascii = False,
+		)
+
+def get_stopwords(lang = '') -> frozenset:
+	'''
+		Return (normalized) stopwords of {lang}, cached per language.
+		Loaded from the precomputed file at config_settings['stopwords_path'] (see store_stopwords()) if it contains {lang},
+		otherwise from NLTK.
+	'''
+	if lang not in _stopwords:
+		path = config_settings.get('stopwords_path', None)
+		precomputed = {}
+		if path and os.path.exists(path):
+			with open(path, 'r', encoding='utf-8') as f:
+				precomputed = json.load(f)
+		_stopwords[lang] = frozenset(
+			precomputed[lang]
+			if lang in precomputed
+			else get_nltk_stopwords(lang)
+		)
+	return _stopwords[lang]
+
 def is_stopword(word: str, lang: str = '') -> bool:
-	return strip_accents(word.lower()) in get_nltk_stopwords(lang)
+	return strip_accents(word.lower()) in get_stopwords(lang)
 
 def is_important_word(word: str, lang: str = '') -> bool:
 	'''
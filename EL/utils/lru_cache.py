@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+class LRUCache():
+	'''
+		Bounded key -> value cache w/ least-recently-used eviction and hit/miss statistics.
+		Usage:
+			cache = LRUCache(maxsize)
+			value = cache.get(key)		# None on miss
+			cache[key] = value
+	'''
+
+	def __init__(
+		self,
+		maxsize: int = 10000,
+	):
+		assert maxsize > 0, 'Invalid cache size'
+		self._maxsize = maxsize
+		self._items = OrderedDict()
+		self._hits = 0
+		self._misses = 0
+
+	def get(
+		self,
+		key: object,
+	) -> object:
+		'''
+			Return cached value of {key} (and mark it as most recently used), otherwise None.
+		'''
+		value = self._items.get(key, None)
+		if value is None:
+			self._misses += 1
+			return None
+		self._hits += 1
+		self._items.move_to_end(key)
+		return value
+
+	def __setitem__(
+		self,
+		key: object,
+		value: object,
+	) -> None:
+		self._items[key] = value
+		self._items.move_to_end(key)
+		if len(self._items) > self._maxsize:
+			self._items.popitem(last = False)
+
+	def __len__(self) -> int:
+		return len(self._items)
+
+	def __contains__(
+		self,
+		key: object,
+	) -> bool:
+		return key in self._items
+
+	def clear(self) -> object:
+		''' Drop cached items, statistics are kept. '''
+		self._items.clear()
+		return self
+
+	def info(self) -> dict:
+		'''
+			Return dict( hits, misses, hit_ratio, size, maxsize )
+		'''
+		lookups = self._hits + self._misses
+		return {
+			'hits': self._hits,
+			'misses': self._misses,
+			'hit_ratio': self._hits / lookups if lookups else 0.0,
+			'size': len(self._items),
+			'maxsize': self._maxsize,
+		}
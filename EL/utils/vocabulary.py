@@ -0,0 +1,68 @@
+class Vocabulary():
+	'''
+		Interned string pool, assigns a stable integer ID to each distinct string once (IDs are never reused).
+		Components sharing a vocabulary refer to strings by ID only, so that each string is held exactly once.
+		Shared (named) vocabularies are created once per process via get_instance(name), i.e.:
+			Vocabulary.get_instance('mentions')		# used by every MentionCountStore (PemIndexers & PemController)
+		Usage:
+			string_id = vocabulary.get_id(string, create = True)
+			string = vocabulary[string_id]
+	'''
+
+	_instances: dict = {}
+
+	@classmethod
+	def get_instance(
+		cls,
+		name: str,
+	) -> object:
+		if name not in cls._instances:
+			cls._instances[name] = cls(name)
+		return cls._instances[name]
+
+	def __init__(
+		self,
+		name: str = None,
+	):
+		self._name = name				# None for private (not shared) vocabularies
+		self._ids: dict = {}			# string as key, ID as value
+		self._strings: list = []		# ID as index, string as value
+
+	@property
+	def name(self) -> str:
+		return self._name
+
+	def get_id(
+		self,
+		string: str,
+		create: bool = False,
+	) -> int:
+		'''
+			Return ID of {string}, otherwise None.
+			If {create} is True, unknown strings are interned and assigned the next available ID.
+		'''
+		string_id = self._ids.get(string, None)
+		if string_id is None and create:
+			string_id = len(self._strings)
+			self._ids[string] = string_id
+			self._strings.append(string)
+		return string_id
+
+	def __getitem__(
+		self,
+		string_id: int,
+	) -> str:
+		return self._strings[string_id]
+
+	def __contains__(
+		self,
+		string: str,
+	) -> bool:
+		return string in self._ids
+
+	def __len__(self) -> int:
+		return len(self._strings)
+
+	def __iter__(self) -> iter:
+		for string in self._strings:
+			yield string
@@ -1,8 +1,8 @@
-from REL.config import config_settings
-from REL.entity_indexers.wiki_entity_indexer import WikiEntityIndexer
-from REL.pem_indexers.wiki_pem_indexer import WikiPemIndexer
-from REL.pem_indexers.yago_pem_indexer import YagoPemIndexer
-from REL.pem_indexers.pem_controller import PemController
+from EL.config import config_settings
+from EL.entity_indexers.wiki_entity_indexer import WikiEntityIndexer
+from EL.pem_indexers.wiki_pem_indexer import WikiPemIndexer
+from EL.pem_indexers.yago_pem_indexer import YagoPemIndexer
+from EL.pem_indexers.pem_controller import PemController
 from pathlib import Path
 
 if __name__ == '__main__':
@@ -16,7 +16,12 @@ if __name__ == '__main__':
 		wikipedia_path
 	).build_entity_index()
 
-	pem_controller = PemController(knowledge_base_entities, datapath)
+	pem_controller = PemController(
+		knowledge_base_entities,
+		datapath,
+		pruning = config_settings.get('pem_pruning', None),
+		source_weights = config_settings.get('pem_source_weights', None),
+	)
 	pem_indexers = [
 		WikiPemIndexer(wikipedia_path)
 		# , YagoPemIndexer(yago_path)
@@ -26,7 +31,13 @@ if __name__ == '__main__':
 	# Example Test Case P(E|M) index:
 	# key = 'Ηνωμένο Βασίλειο'
 	# print(f'\nTest case:\n\t"{key}"')
-	# print(pem_controller._pem[key])
+	# print(pem_controller.lookup(key, top_k = 10))
 
-	# Uncomment following line to store pem index in DB (TODO):
+	# Uncomment following line to store pem index in a local SQLite db (see EL.pem_indexers.pem_database.PemDatabase):
 	# pem_controller.store()
+
+	# Uncomment following line to store pem index in a read-only memory-mapped file (see EL.pem_indexers.pem_mmap_index.PemMmapIndex):
+	# pem_controller.store_mmap()
+
+	# Uncomment following line to store raw mention - entity counts, so that new sources can be merged w/o a full rebuild (see PemController.load_counts()):
+	# pem_controller.store_counts()